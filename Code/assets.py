@@ -0,0 +1,143 @@
+__author__ = 'Will Evans'
+
+import os
+import pygame as pg
+import window
+
+# Folders of sprite skins every level uses, loaded before the sprites are made
+SPRITE_FOLDERS = ['scared', 'dead', 'scared_flashing', 'death_animation']
+
+# Scaled images shared by every sprite, keyed by (path, size, smooth). Each image is only loaded from disk once
+images = {}
+
+# Dictionaries of {file name: image} for every image in a folder, keyed by (folder, size)
+folders = {}
+
+# SpriteAtlas of each folder of sprite skins, keyed by (folder, size)
+atlases = {}
+
+
+def get_image(path, size, smooth=False):
+    """
+    Returns a scaled image, loading it if it hasn't been already. The same Surface is given to every caller, so it must
+    not be drawn on.
+    :param path: Path of the image file.
+    :param size: (width, height) in pixels.
+    :param smooth: Boolean: scale with smoothscale (for large images like the logo) or not.
+    :return: Surface.
+    """
+
+    key = (os.path.normcase(path), tuple(size), smooth)
+    if key not in images:
+        image = pg.image.load(path)
+
+        # Surfaces in the same pixel format as the window blit faster (only possible once there is a window)
+        if pg.display.get_surface() is not None:
+            image = image.convert_alpha()
+        if smooth:
+            images[key] = pg.transform.smoothscale(image, key[1])
+        else:
+            images[key] = pg.transform.scale(image, key[1])
+
+    return images[key]
+
+
+def get_images(folder, size):
+    """
+    Returns every image in a folder, scaled to the same size.
+    :param folder: Path of the folder.
+    :param size: (width, height) in pixels.
+    :return: Dictionary of {file name: Surface}.
+    """
+
+    key = (os.path.normcase(folder), tuple(size))
+    if key not in folders:
+        folders[key] = {name: get_image(os.path.join(folder, name), size) for name in os.listdir(folder)}
+
+    # Sprites keep their own dictionary of skins
+    return dict(folders[key])
+
+
+class SpriteAtlas:
+    def __init__(self, folder, size):
+        """
+        Every skin in a folder drawn side by side onto one surface. Skins are found by a key made from their file name
+        (e.g. 'e_1.png' is ('e', 1) and '10.png' is (10,)), which gives the part of the surface to blit.
+        :param folder: Path of the folder.
+        :param size: (width, height) of each skin in pixels.
+        """
+
+        names = sorted(os.listdir(folder))
+        width, height = size
+        self.size = (width, height)
+        self.surface = pg.Surface((width * len(names), height), pg.SRCALPHA)
+        self.rects = {}
+
+        for num, name in enumerate(names):
+            image = pg.transform.scale(pg.image.load(os.path.join(folder, name)), self.size)
+            rect = pg.Rect(num * width, 0, width, height)
+            self.surface.blit(image, rect)
+            self.rects[get_skin_key(name)] = rect
+
+        if pg.display.get_surface() is not None:
+            self.surface = self.surface.convert_alpha()
+
+    def get_rect(self, **kwargs):
+        """
+        :param kwargs: Position of the rect, like Surface.get_rect (e.g. center=(x, y)).
+        :return: Rect the size of one skin.
+        """
+
+        rect = pg.Rect((0, 0), self.size)
+        for attribute, value in kwargs.items():
+            setattr(rect, attribute, value)
+        return rect
+
+    def blit(self, win, key, rect):
+        """
+        Blits one skin.
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :param key: Skin key (see get_skin_key).
+        :param rect: Where to blit the skin.
+        :return: None
+        """
+
+        win.blit(self.surface, rect, self.rects[key])
+
+
+def get_skin_key(name):
+    """
+    Turns a skin's file name into its key, e.g. 'e_1.png' into ('e', 1).
+    :param name: File name.
+    :return: Tuple of the parts of the name (numbers as ints).
+    """
+
+    parts = os.path.splitext(name)[0].split('_')
+    return tuple(int(part) if part.isdigit() else part for part in parts)
+
+
+def get_atlas(folder, size):
+    """
+    Returns the SpriteAtlas of a folder of skins, making it if it hasn't been already.
+    :param folder: Path of the folder.
+    :param size: (width, height) of each skin in pixels.
+    :return: SpriteAtlas.
+    """
+
+    key = (os.path.normcase(folder), tuple(size))
+    if key not in atlases:
+        atlases[key] = SpriteAtlas(folder, size)
+    return atlases[key]
+
+
+def prewarm(resource_packs):
+    """
+    Loads the skins of every sprite in a level before the sprites are made. Run when a level loads.
+    :param resource_packs: Names of the sprites' resource packs (e.g. 'pac-man', 'blinky').
+    :return: None
+    """
+
+    # Sprites are drawn onto the logical surface, which is the same size whatever the window scale is
+    skin_size = (22 * window.LOGICAL_SCALE, 22 * window.LOGICAL_SCALE)
+    for folder in list(resource_packs) + SPRITE_FOLDERS:
+        get_atlas(os.path.join('resources', 'sprites', folder), skin_size)
@@ -0,0 +1,340 @@
+__author__ = 'Will Evans'
+
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+
+# The benchmark never opens a window, so pygame (imported by datastructures) is told not to look for a display
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from datastructures import get_maze_hash, FACINGS, OPPOSITES, VECTORS, NextHopTable, ReachabilityIndex
+from datastructures import NEXT_HOP_TABLE_MAX_TILES
+import local_database
+import pathfinding
+
+HEURISTICS = {'Dijkstra': pathfinding.Dijkstra, 'Manhattan': pathfinding.Manhattan, 'Euclidean': pathfinding.Euclidean}
+
+# NumpySearch is only run (with its own method, the distance maps) if NumPy is installed
+if pathfinding.np is not None:
+    HEURISTICS['NumPy'] = pathfinding.NumpySearch
+
+# Ways of answering a search: reading the NextHopTable (what the ghosts do in every maze small enough to have one), the
+# JunctionGraph search Search falls back to without a table, a tile by tile search and NumpySearch's distance maps. The
+# table doesn't use the heuristic, so it is only run with Manhattan (the ghosts' Search)
+METHODS = {'table': 'find_path', 'junction': 'junction_astar', 'tile': 'tile_astar', 'map': 'map_astar'}
+
+# Ghost targets in tile_map coords (the sprites add 3 to y for the score bar). Homes are the scatter targets of each
+# ghost. Ghosts leave the house from the tile above it, and dead ghosts go back into the house (Ghost.respawn), then out
+# of it again, before they carry on
+HOMES = {'blinky': (26, 1), 'pinky': (1, 1), 'clyde': (1, 29), 'inky': (26, 29)}
+HOUSE = (13, 15)
+HOUSE_EXIT = (13, 11)
+
+# Pinky targets the tile this many tiles in front of Pac-Man, and Clyde only chases Pac-Man from further away than this
+PINKY_AHEAD = 4
+CLYDE_DISTANCE = 8
+
+# Level 1 Ghost.mode_timings (in seconds), which switch between scatter and chase starting with scatter, and how long
+# ghosts stay frightened after Pac-Man eats a power pellet (Ghost.scared_timer)
+MODE_TIMINGS = [7, 20, 7, 20, 5, 20, 5, 9999]
+FRIGHTENED_TIME = 8
+
+# Ghosts move 4/3 pixels a frame at 60 frames a second and tiles are 12 pixels wide
+TILES_PER_SECOND = 4 / 3 * 60 / 12
+
+PERCENTILES = (50, 90, 99)
+
+
+def load_mazes():
+    """
+    Loads every maze in resources/Levels.txt and the Mazes table. Mazes that appear in both are only loaded once.
+    :return: List of (name, 2D maze list).
+    """
+
+    mazes = []
+    hashes = set()
+
+    with open(os.path.join('resources', 'Levels.txt'), 'r') as json_file:
+        levels = json.load(json_file)
+    named = [(name, tile_map) for name, tile_map in levels.items()]
+
+    try:
+        named += [(f'Maze {maze_id}', json.loads(maze)) for maze_id, maze in local_database.get_mazes()]
+    except Exception as e:
+        print(f'{e} loading mazes from the database')
+
+    for name, tile_map in named:
+        maze_hash = get_maze_hash(tile_map)
+        if maze_hash not in hashes:
+            hashes.add(maze_hash)
+            mazes.append((name, tile_map))
+
+    return mazes
+
+
+def get_next_hops(tile_map):
+    """
+    :param tile_map: 2D list of the maze.
+    :return: The maze's NextHopTable, or None if the maze is too large to have one (like Maze).
+    """
+
+    if sum(tile != 1 for row in tile_map for tile in row) <= NEXT_HOP_TABLE_MAX_TILES:
+        return NextHopTable(tile_map, background=False)
+    return None
+
+
+def get_mode(seconds):
+    """
+    :param seconds: Time since the level started.
+    :return: 'scatter' or 'chase', following MODE_TIMINGS.
+    """
+
+    for num, timing in enumerate(MODE_TIMINGS):
+        if seconds < timing:
+            return 'scatter' if num % 2 == 0 else 'chase'
+        seconds -= timing
+    return 'chase'
+
+
+def get_step(board, tile, facing, rng):
+    """
+    Picks a random move for a sprite, turning around only at dead ends.
+    :param board: WalkableBoard of the maze.
+    :param tile: (tilex, tiley).
+    :param facing: Direction the sprite is facing.
+    :param rng: random.Random object.
+    :return: (tile, facing) after the move (unchanged if the sprite can't move).
+    """
+
+    children = board.get_children(*tile, facing) or board.get_children(*tile, OPPOSITES[facing])
+    if not children:
+        return tile, facing
+    move, x, y = rng.choice(children)
+    return (x, y), move
+
+
+def get_chase_target(name, ghosts, pac_man, pac_man_facing, reachability):
+    """
+    Works out a ghost's chase target, the same way as the chase method of each Ghost.
+    :param name: 'blinky', 'pinky', 'inky' or 'clyde'.
+    :param ghosts: Dictionary of name: ghost state (Inky's target depends on where Blinky is).
+    :param pac_man: Pac-Man's tile.
+    :param pac_man_facing: Direction Pac-Man is facing.
+    :param reachability: ReachabilityIndex of the maze (Pinky and Inky's targets can be walls).
+    :return: Target tile.
+    """
+
+    pac_x, pac_y = pac_man
+    target = pac_man
+    if name == 'pinky':
+        dx, dy = VECTORS[pac_man_facing]
+        target = reachability.get_nearest((pac_x + dx * PINKY_AHEAD, pac_y + dy * PINKY_AHEAD))
+    elif name == 'inky':
+        blinky_x, blinky_y = ghosts['blinky']['tile']
+        target = reachability.get_nearest((2 * pac_x - blinky_x, 2 * pac_y - blinky_y))
+    elif name == 'clyde':
+        x, y = ghosts['clyde']['tile']
+        if ((x - pac_x)**2 + (y - pac_y)**2)**0.5 <= CLYDE_DISTANCE:
+            target = HOMES['clyde']
+
+    return pac_man if target is None else target
+
+
+def get_queries(search, count, rng):
+    """
+    Replays the four ghosts moving around the maze one tile at a time and records the searches they make. Like the
+    Ghosts, they search at junctions (or when their mode changes or their path runs out) and otherwise follow their path.
+    They scatter to their homes and chase on the level 1 timings, each with its own chase target. Pac-Man wanders the
+    maze at random, and when he eats a power pellet the ghosts are frightened and target random pellets for a while. A
+    frightened ghost that Pac-Man catches goes back into the ghost house and out again (respawn).
+    :param search: Search of the maze, used to move the ghosts along their paths.
+    :param count: Number of queries.
+    :param rng: random.Random object (so the same seed always gives the same queries).
+    :return: List of (mode, (start, end, facing)).
+    """
+
+    tile_map = search.maze
+    board = search.tunnels.board
+    wraps = search.tunnels.wraps
+    reachability = ReachabilityIndex(tile_map, wraps)
+    has_house = board.has(*HOUSE) and board.has(*HOUSE_EXIT)
+
+    # Pac-Man can start on any tile that isn't a wall, out of bounds or in the ghost house
+    tiles = [(x, y) for y, row in enumerate(tile_map) for x, data in enumerate(row) if data not in (1, 5, 6)]
+    pellets = [(x, y) for y, row in enumerate(tile_map) for x, data in enumerate(row) if data == 0] or tiles
+    power_pellets = {(x, y) for y, row in enumerate(tile_map) for x, data in enumerate(row) if data == 2}
+
+    pac_man, pac_man_facing = rng.choice(tiles), rng.choice(FACINGS)
+    start = HOUSE_EXIT if board.has(*HOUSE_EXIT) else rng.choice(tiles)
+    # Each ghost's respawn is None, 'dead' (heading into the house) or 'respawned' (heading out of it)
+    ghosts = {name: {'tile': start, 'facing': rng.choice('ew'), 'mode': None, 'path': None, 'respawn': None}
+              for name in HOMES}
+    frightened = 0
+
+    queries = []
+    step = 0
+    while len(queries) < count:
+        frightened = max(frightened - 1, 0)
+        level_mode = get_mode(step / TILES_PER_SECOND)
+
+        for name, ghost in ghosts.items():
+            tile, path = ghost['tile'], ghost['path']
+
+            # Ghost.respawn's targets, the house and then the tile above it
+            if ghost['respawn'] == 'dead' and tile == HOUSE:
+                ghost['respawn'] = 'respawned'
+            elif ghost['respawn'] == 'respawned' and tile == HOUSE_EXIT:
+                ghost['respawn'] = None
+
+            if ghost['respawn'] is not None:
+                mode = 'respawn'
+            elif frightened > 0:
+                mode = 'frightened'
+            else:
+                mode = level_mode
+
+            if path is not None and len(path) > 2 and mode == ghost['mode'] and len(board.get_exits(*tile)) == 2:
+                path = path[1:]
+            else:
+                if mode == 'respawn':
+                    end = HOUSE if ghost['respawn'] == 'dead' else HOUSE_EXIT
+                elif mode == 'scatter':
+                    end = HOMES[name]
+                elif mode == 'chase':
+                    end = get_chase_target(name, ghosts, pac_man, pac_man_facing, reachability)
+                else:
+                    end = rng.choice(pellets)
+                query = (tile, end, ghost['facing'])
+                queries.append((mode, query))
+                path = search.find_path(*query)
+                ghost['mode'] = mode
+
+            if path is None or len(path) < 2:
+                ghost['path'] = None
+                ghost['tile'], ghost['facing'] = get_step(board, tile, ghost['facing'], rng)
+            else:
+                ghost['path'] = path
+                ghost['tile'], ghost['facing'] = path[1], pathfinding.get_direction(tile, path[1], wraps)
+
+        previous = pac_man
+        pac_man, pac_man_facing = get_step(board, pac_man, pac_man_facing, rng)
+        if pac_man in power_pellets:
+            power_pellets.remove(pac_man)
+            frightened = int(FRIGHTENED_TIME * TILES_PER_SECOND)
+
+        # Frightened ghosts on (or passing) Pac-Man's tile are caught
+        for ghost in ghosts.values():
+            caught = ghost['tile'] in (pac_man, previous)
+            if has_house and frightened > 0 and ghost['respawn'] is None and caught:
+                ghost['respawn'] = 'dead'
+        step += 1
+
+    return queries[:count]
+
+
+def get_percentile(values, percentile):
+    """
+    :param values: Sorted list of numbers.
+    :param percentile: 0 - 100.
+    :return: The value at the percentile (nearest rank).
+    """
+
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def measure(search, method, queries):
+    """
+    Runs every query through one search method, timing each one. Memory is measured in a second run, as tracemalloc
+    slows everything down. For each query it is the most memory allocated at any point during the call (the peak above
+    what was allocated before it), so memory that is freed before the query returns (e.g. the open queue) is counted.
+    :param search: Search object (made without a path cache, so every query is answered).
+    :param method: Name of the Search method to call.
+    :param queries: List of (start, end, facing).
+    :return: Dictionary of results.
+    """
+
+    find = getattr(search, method)
+
+    search.expanded = 0
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        find(*query)
+        latencies.append(time.perf_counter() - start_time)
+    expanded = search.expanded
+    latencies.sort()
+
+    tracemalloc.start()
+    peak = 0
+    for query in queries:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        path = find(*query)
+        peak += tracemalloc.get_traced_memory()[1] - before
+        del path
+    tracemalloc.stop()
+
+    results = {'percentiles': {percentile: get_percentile(latencies, percentile) * 1000 for percentile in PERCENTILES},
+               'max': latencies[-1] * 1000,
+               'expanded': expanded / len(queries),
+               'peak': peak / len(queries) / 1024}
+    return results
+
+
+def run_benchmark(count=1000, seed=0):
+    """
+    Runs the benchmark over every maze, heuristic and search method.
+    :param count: Number of queries per maze.
+    :param seed: Random seed for the queries.
+    :return: List of (maze name, heuristic, method, results).
+    """
+
+    rows = []
+    for name, tile_map in load_mazes():
+        next_hops = get_next_hops(tile_map)
+        ghost_search = pathfinding.Manhattan(tile_map, next_hops, path_cache=False)
+        queries = [query for _, query in get_queries(ghost_search, count, random.Random(seed))]
+
+        for heuristic, search_class in HEURISTICS.items():
+            search = search_class(tile_map, next_hops, path_cache=False)
+            for method_name, method in METHODS.items():
+                if method_name == 'table' and (next_hops is None or search_class is not pathfinding.Manhattan):
+                    continue
+                if (method_name == 'map') != (search_class is pathfinding.NumpySearch):
+                    continue
+                rows.append((name, heuristic, method_name, measure(search, method, queries)))
+    return rows
+
+
+def print_results(rows):
+    """
+    Prints the results as a table.
+    :param rows: Output of run_benchmark.
+    :return: None
+    """
+
+    headings = ['Maze', 'Heuristic', 'Method'] + [f'p{percentile} ms' for percentile in PERCENTILES] + \
+               ['Max ms', 'Expanded', 'Peak KiB']
+    lines = [headings]
+    for name, heuristic, method, results in rows:
+        lines.append([name, heuristic, method] +
+                     [f'{results["percentiles"][percentile]:.3f}' for percentile in PERCENTILES] +
+                     [f'{results["max"]:.3f}', f'{results["expanded"]:.1f}', f'{results["peak"]:.2f}'])
+
+    widths = [max(len(line[num]) for line in lines) for num in range(len(headings))]
+    for line in lines:
+        print('  '.join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the NextHopTable and the pathfinding heuristics on every '
+                                                 'maze, using searches replayed from ghosts moving around it.')
+    parser.add_argument('--queries', type=int, default=1000, help='Number of queries per maze.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the queries.')
+    args = parser.parse_args()
+
+    print_results(run_benchmark(args.queries, args.seed))
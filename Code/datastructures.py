@@ -1,31 +1,101 @@
 __author__ = 'Will Evans'
 
+from collections import deque
+import assets
+import hashlib
+import heapq
 import json
 import local_database
 import pygame as pg
 import os
+import threading
+
+
+# Directions a sprite can face / move in, the tile offset of each move and the move that would reverse it
+FACINGS = 'nesw'
+VECTORS = {'n': (0, -1), 'e': (1, 0), 's': (0, 1), 'w': (-1, 0)}
+OPPOSITES = {'n': 's', 'e': 'w', 's': 'n', 'w': 'e'}
+
+# Moves (and their tile offsets) a sprite facing each direction can make, in the order children are generated
+CHILD_VECTORS = {facing: tuple((move, *VECTORS[move]) for move in 'sewn' if move != OPPOSITES[facing])
+                 for facing in FACINGS}
+
+# Increase this when the way NextHopTable is built changes, so that tables saved in the database are rebuilt
+NEXT_HOP_TABLE_VERSION = 2
+
+# Tables grow with the square of the number of tiles (Level1's 390 tiles take about 1s to build, 780 tiles about 3.7s),
+# so larger (user created) mazes are searched instead
+NEXT_HOP_TABLE_MAX_TILES = 800
+
+# Sprites slow down in tunnels (ghosts go from 4/3 to 0.8), so moving onto a tunnel tile costs two moves
+TUNNEL_COST = 2
+
+# Tile types (numbers from the maze json file) sprites can move onto
+WALKABLE_TYPES = (0, 2, 3, 4, 5, 6)
 
 
 class PriorityQueue:
 
     def __init__(self):
+        """
+        Open set for the search algorithms. Nodes are kept in a binary heap ordered by f score (ties are broken by the
+        order they were added) and indexed by (x, y, facing) so that membership checks do not have to scan the queue.
+        """
+
         self.queue = []
+        self.entries = {}
+        self.count = 0
 
     def is_empty(self):
-        return len(self.queue) == 0
+        return len(self.entries) == 0
 
     def en_queue(self, node):
-        self.queue.append(node)
+        """
+        Adds a node to the queue. If a node for the same (x, y, facing) is already queued it is only replaced when the
+        new node has a lower f score (decrease-key).
+        :param node: Node object.
+        :return: None
+        """
+
+        key = (node.x, node.y, node.facing)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if node.f_score >= entry[2].f_score:
+                return
+            # The old entry is left in the heap but marked as removed, it is skipped when it is popped
+            entry[2] = None
+
+        entry = [node.f_score, self.count, node]
+        self.count += 1
+        self.entries[key] = entry
+        heapq.heappush(self.queue, entry)
 
     def pop(self):
-        self.queue.sort(key=lambda x: x.f_score)
-        return self.queue.pop(0)
+        while self.queue:
+            node = heapq.heappop(self.queue)[2]
+            if node is not None:
+                del self.entries[(node.x, node.y, node.facing)]
+                return node
+        raise IndexError('pop from an empty priority queue')
 
     def has(self, child):
-        for node in self.queue:
-            if node.x == child.x and node.y == child.y:
-                return True
-        return False
+        return (child.x, child.y, child.facing) in self.entries
+
+
+class ClosedSet:
+
+    def __init__(self):
+        """
+        Set of nodes that have already been evaluated, keyed the same way as the PriorityQueue (x, y, facing).
+        """
+
+        self.keys = set()
+
+    def add(self, node):
+        self.keys.add((node.x, node.y, node.facing))
+
+    def has(self, child):
+        return (child.x, child.y, child.facing) in self.keys
 
 
 def get_maze(maze_id):
@@ -38,7 +108,629 @@ def get_maze(maze_id):
     return json.loads(local_database.get_maze(maze_id))
 
 
+def get_maze_hash(tile_map):
+    """
+    Hashes the contents of a maze, so that tables compiled from the maze can be saved and found again.
+    :param tile_map: 2D list of the maze.
+    :return: Hex digest of the maze contents.
+    """
+
+    return hashlib.sha1(json.dumps(tile_map).encode()).hexdigest()
+
+
+def get_wraps(tile_map):
+    """
+    Finds the tunnels that wrap around the edge of a maze. A row (or column) that is open at both ends is a tunnel,
+    moving off one end puts a sprite on the other end. Out of bounds tiles (5) don't count as open.
+    :param tile_map: 2D list of the maze.
+    :return: Dictionary of (x, y, move): (x, y) of the tile on the other side.
+    """
+
+    wraps = {}
+    for y, row in enumerate(tile_map):
+        if row and row[0] not in (1, 5) and row[-1] not in (1, 5):
+            wraps[(0, y, 'w')] = (len(row) - 1, y)
+            wraps[(len(row) - 1, y, 'e')] = (0, y)
+
+    height = len(tile_map)
+    for x in range(min(len(row) for row in tile_map)):
+        if tile_map[0][x] not in (1, 5) and tile_map[-1][x] not in (1, 5):
+            wraps[(x, 0, 'n')] = (x, height - 1)
+            wraps[(x, height - 1, 's')] = (x, 0)
+
+    return wraps
+
+
+def get_neighbour(tile_map, wraps, x, y, move):
+    """
+    Returns the tile a move leads to, going through the wrap around tunnels.
+    :param tile_map: 2D list of the maze.
+    :param wraps: Wrap around tunnels from get_wraps.
+    :param x: Tile x.
+    :param y: Tile y.
+    :param move: Move ('n', 'e', 's', 'w').
+    :return: (x, y) of the next tile, or None if it is a wall or outside the maze.
+    """
+
+    if (x, y, move) in wraps:
+        x, y = wraps[(x, y, move)]
+    else:
+        dx, dy = VECTORS[move]
+        x, y = x + dx, y + dy
+        if not (0 <= y < len(tile_map) and 0 <= x < len(tile_map[y])):
+            return None
+
+    if tile_map[y][x] == 1:
+        return None
+    return x, y
+
+
+def get_tunnel_tiles(tile_map, wraps):
+    """
+    Finds the tiles sprites slow down on: the corridor leading into each wrap around tunnel, from the edge of the maze
+    to the first junction.
+    :param tile_map: 2D list of the maze.
+    :param wraps: Wrap around tunnels from get_wraps.
+    :return: Set of (x, y).
+    """
+
+    tunnels = set()
+    for x, y, move in wraps:
+        # Walking in from the mouth of the tunnel until there is a choice of direction
+        facing = OPPOSITES[move]
+        while (x, y) not in tunnels:
+            exits = [move for move in FACINGS if get_neighbour(tile_map, wraps, x, y, move) is not None]
+            if len(exits) != 2:
+                break
+            tunnels.add((x, y))
+
+            # Corridors have two exits, one of which is behind
+            first, second = exits
+            facing = second if first == OPPOSITES[facing] else first
+            x, y = get_neighbour(tile_map, wraps, x, y, facing)
+
+    return tunnels
+
+
+# Wall skins already worked out, shared by every maze. Keyed by the tile types around the wall (and the coords, for the
+# few skins that depend on them)
+wall_skin_table = {}
+
+
+def classify_walls(tile_map):
+    """
+    Works out the skin of every wall in one pass over the maze, looking up the walls in wall_skin_table.
+    :param tile_map: 2D list of the maze.
+    :return: 2D list of skin names (None for tiles that aren't walls).
+    """
+
+    # Pellets (2) look the same as empty tiles (0) to the walls. The maze is surrounded by None (outside the maze)
+    width = max((len(row) for row in tile_map), default=0)
+    padded = [[None] * (width + 2)]
+    padded += [[None] + [0 if data == 2 else data for data in row] + [None] * (width + 1 - len(row)) for row in tile_map]
+    padded += [[None] * (width + 2)]
+
+    skins = []
+    for y, row in enumerate(tile_map):
+        skins.append([None] * len(row))
+        above, middle, below = padded[y], padded[y + 1], padded[y + 2]
+        for x, data in enumerate(row):
+            if data != 1:
+                continue
+            # s, e, w, n, ne, se, sw, nw (the padding shifts every tile one right)
+            adjacent = (below[x + 1], middle[x + 2], middle[x], above[x + 1], above[x + 2], below[x + 2], below[x],
+                        above[x])
+            key = (adjacent, x if x in (10, 17) else None, y if y in (12, 16) else None)
+            if key not in wall_skin_table:
+                wall_skin_table[key] = classify_wall(adjacent, x, y)
+            skins[y][x] = wall_skin_table[key]
+
+    return skins
+
+
+def load_wall_skins(maze_id, tile_map):
+    """
+    Returns the wall skins of a maze, reading them from the database if they have been worked out before.
+    :param maze_id: MazeID.
+    :param tile_map: 2D list of the maze.
+    :return: 2D list of skin names (None for tiles that aren't walls).
+    """
+
+    maze_hash = get_maze_hash(tile_map)
+    skins = local_database.get_wall_skins(maze_id, maze_hash)
+    if skins is None:
+        skins = classify_walls(tile_map)
+        local_database.save_wall_skins(maze_id, maze_hash, skins)
+    return skins
+
+
+def classify_wall(adjacent, tile_x, tile_y):
+    """
+    Works out what skin a wall should have based on the type of tile in the surrounding 8 spaces.
+    :param adjacent: Tile types in the order s, e, w, n, ne, se, sw, nw (pellets (2) as 0, None outside the maze).
+    :param tile_x: x coord of tile.
+    :param tile_y: y coord of tile.
+    :return: String name of skin for the wall.
+    """
+
+    values = adjacent[:4]
+    values_diag = adjacent
+
+    # ghost edges
+    if values == (4, 3, 1, 4):
+        return 'left_end_ghost'
+
+    if values == (4, 1, 3, 4):
+        return 'right_end_ghost'
+
+    if values == (4, 1, 1, 4) and tile_y == 12:
+        return 'lower_boundary'
+
+    if values == (4, 1, 1, 4) and tile_y == 16:
+        return 'upper_boundary'
+
+    if values == (1, 4, 4, 1) and tile_x == 10:
+        return 'right_boundary'
+
+    if values == (1, 4, 4, 1) and tile_x == 17:
+        return 'left_boundary'
+
+    # ghost corners
+    if values_diag == (1, 1, 4, 4, 4, 4, 4, 4):
+        return 'left_upper_corner_ghost'
+
+    if values_diag == (1, 4, 1, 4, 4, 4, 4, 4):
+        return 'right_upper_corner_ghost'
+
+    if values_diag == (4, 4, 1, 1, 4, 4, 4, 4):
+        return 'right_lower_corner_ghost'
+
+    if values_diag == (4, 1, 4, 1, 4, 4, 4, 4):
+        return 'left_lower_corner_ghost'
+
+    # boundaries edges
+    values_temp = tuple([1 if x is None else x for x in values])
+
+    if values == (0, 1, 1, None) or values == (0, 1, 1, 5) or values_temp == (4, 1, 1, 5):
+        return 'upper_boundary'
+
+    if values == (None, 1, 1, 0) or values == (5, 1, 1, 0) or values_temp == (5, 1, 1, 4):
+        return 'lower_boundary'
+
+    if values == (1, 0, None, 1) or values == (1, 0, 4, 1) or values == (1, 0, 5, 1):
+        return 'left_boundary'
+
+    if values == (1, None, 0, 1) or values == (1, 4, 0, 1) or values == (1, 5, 0, 1):
+        return 'right_boundary'
+
+    # boundary spits
+    if values_diag == (1, 1, 1, None, None, 1, 0, None):
+        return 'upper_left_spit_boundary'
+
+    if values_diag == (1, 1, 1, None, None, 0, 1, None):
+        return 'upper_right_spit_boundary'
+
+    if values_diag == (None, 1, 1, 1, 1, None, None, 0):
+        return 'lower_left_spit_boundary'
+
+    if values_diag == (None, 1, 1, 1, 0, None, None, 1):
+        return 'lower_right_spit_boundary'
+
+    if values_diag == (1, None, 1, 1, None, None, 1, 0):
+        return 'right_upper_spit_boundary'
+
+    if values_diag == (1, None, 1, 1, None, None, 0, 1):
+        return 'right_lower_spit_boundary'
+
+    if values_diag == (1, 1, None, 1, 1, 0, None, None):
+        return 'left_lower_spit_boundary'
+
+    if values_diag == (1, 1, None, 1, 0, 1, None, None):
+        return 'left_upper_spit_boundary'
+
+    # boundary corners
+    if values == (1, 1, None, None) or values == (1, 1, None, 5):
+        return 'left_upper_boundary'
+
+    if values == (1, None, 1, None) or values == (1, None, 1, 5):
+        return 'right_upper_boundary'
+
+    if values == (None, None, 1, 1) or values == (5, None, 1, 1):
+        return 'right_lower_boundary'
+
+    if values == (None, 1, None, 1) or values == (5, 1, None, 1):
+        return 'left_lower_boundary'
+
+    # corners
+    values_temp = tuple([0 if x == 4 else x for x in values])
+    values_diag_temp = tuple([0 if x == 4 else x for x in values_diag])
+
+    if values_temp == (1, 1, 0, 0):
+        return 'left_upper_corner'
+
+    if values_temp == (1, 0, 1, 0):
+        return 'right_upper_corner'
+
+    if values_temp == (0, 1, 0, 1):
+        return 'left_lower_corner'
+
+    if values_temp == (0, 0, 1, 1):
+        return 'right_lower_corner'
+
+    if values_diag_temp == (1, 1, 1, 1, 1, 0, 1, 1):
+        return 'left_upper_inside_corner'
+
+    if values_diag_temp == (1, 1, 1, 1, 1, 1, 0, 1):
+        return 'right_upper_inside_corner'
+
+    if values_diag_temp == (1, 1, 1, 1, 0, 1, 1, 1):
+        return 'left_lower_inside_corner'
+
+    if values_diag_temp == (1, 1, 1, 1, 1, 1, 1, 0):
+        return 'right_lower_inside_corner'
+
+    # edges
+    values_temp = tuple([1 if x == 6 else x for x in [0 if x == 4 else x for x in values]])
+    if values_temp == (1, 1, 1, 0):
+        return 'upper_edge'
+
+    if values_temp == (1, 1, 0, 1):
+        return 'right_edge'
+
+    if values_temp == (0, 1, 1, 1):
+        return 'lower_edge'
+
+    if values_temp == (1, 0, 1, 1):
+        return 'left_edge'
+
+    return 'temp'
+
+
+class BitBoard:
+    def __init__(self, tile_map, types):
+        """
+        Bit packed set of tiles, with one int per row of the maze. Bit x of row y is set if the tile is in the set, so
+        checking a tile is a bit operation instead of a 2D list lookup.
+        :param tile_map: 2D list of the maze.
+        :param types: Tile types that start in the set.
+        """
+
+        self.height = len(tile_map)
+        self.width = max((len(row) for row in tile_map), default=0)
+        self.rows = [sum(1 << x for x, data in enumerate(row) if data in types) for row in tile_map]
+
+    def has(self, x, y):
+        """
+        :param x: Tile x.
+        :param y: Tile y.
+        :return: True if the tile is in the set (tiles outside the maze never are).
+        """
+
+        return 0 <= y < self.height and 0 <= x and self.rows[y] >> x & 1 == 1
+
+    def get_tiles(self):
+        """
+        :return: List of (x, y) of every tile in the set.
+        """
+
+        return [(x, y) for y, row in enumerate(self.rows) for x in range(row.bit_length()) if row >> x & 1]
+
+
+class WalkableBoard(BitBoard):
+    def __init__(self, tile_map, wraps):
+        """
+        BitBoard of the tiles that aren't walls, with the moves out of every tile worked out once. The moves are found a
+        whole row at a time (a tile can be moved east from if it and the tile to its right are both walkable, which is
+        row & row >> 1), then the wrap around tunnels are added. Each Maze builds one, which every sprite and search of
+        the maze shares.
+        :param tile_map: 2D list of the maze.
+        :param wraps: Wrap around tunnels from get_wraps.
+        """
+
+        super().__init__(tile_map, WALKABLE_TYPES)
+        self.wraps = wraps
+        self.tunnels = get_tunnel_tiles(tile_map, wraps)
+
+        # JunctionGraph of the maze, built by the first search that needs it (see Search.get_junction_graph)
+        self.junction_graph = None
+
+        # Masks of the tiles in each row that can be moved out of in each direction
+        self.moves = {'n': [row & above for row, above in zip(self.rows, [0] + self.rows[:-1])],
+                      'e': [row & row >> 1 for row in self.rows],
+                      's': [row & below for row, below in zip(self.rows, self.rows[1:] + [0])],
+                      'w': [row & row << 1 for row in self.rows]}
+        for x, y, move in wraps:
+            self.moves[move][y] |= 1 << x
+
+        # Children of every tile for every facing, as (move, x, y) in CHILD_VECTORS order. Indexed by y * width + x
+        self.children = {facing: [()] * (self.width * self.height) for facing in FACINGS}
+        for y in range(self.height):
+            for x in range(self.width):
+                for facing in FACINGS:
+                    self.children[facing][y * self.width + x] = tuple(
+                        (move, *wraps.get((x, y, move), (x + dx, y + dy)))
+                        for move, dx, dy in CHILD_VECTORS[facing] if self.moves[move][y] >> x & 1)
+
+    def get_exits(self, x, y):
+        """
+        :param x: Tile x.
+        :param y: Tile y.
+        :return: String of the moves that can be made from the tile (in FACINGS order).
+        """
+
+        if not (0 <= y < self.height and 0 <= x):
+            return ''
+        return ''.join(move for move in FACINGS if self.moves[move][y] >> x & 1)
+
+    def get_junctions(self):
+        """
+        Junctions are the tiles that don't have exactly two exits. Between them a sprite can only keep going forward.
+        :return: Set of (x, y).
+        """
+
+        return {(x, y) for x, y in self.get_tiles() if len(self.get_exits(x, y)) != 2}
+
+    def get_children(self, x, y, facing):
+        """
+        Returns the moves a sprite on a tile can make without turning around.
+        :param x: Tile x.
+        :param y: Tile y.
+        :param facing: Direction the sprite is facing.
+        :return: Tuple of (move, x, y) for each move.
+        """
+
+        if 0 <= y < self.height and 0 <= x < self.width:
+            return self.children[facing][y * self.width + x]
+        return ()
+
+
+class NextHopTable:
+    # Tables that have already been loaded / built, so that each maze is only compiled once per launch
+    tables = {}
+    # Hashes of the mazes whose tables are being built in the background
+    building = set()
+    lock = threading.Lock()
+
+    def __init__(self, tile_map, background=True):
+        """
+        Compiled lookup of the first move of the shortest path from every (tile, facing) to every target tile in the
+        maze. Moves follow the same rules as the search (no walls and no turning around), so looking up a path is a
+        series of table reads instead of a search. Tables are saved to the database, keyed by a hash of the maze, so
+        they are only ever built once for each maze.
+        :param tile_map: 2D list of the maze.
+        :param background: If the table isn't saved yet, build it on a separate thread (taking seconds for larger
+        mazes) instead of holding up the level loading. Until it is ready has() is False, so paths are searched for.
+        """
+
+        self.tile_map = tile_map
+
+        # Every tile that isn't a wall is given an index. Each (tile, facing) state is then tile index * 4 + facing
+        self.tiles = [(x, y) for y, row in enumerate(tile_map) for x, data in enumerate(row) if data != 1]
+        self.index = {tile: num for num, tile in enumerate(self.tiles)}
+        self.wraps = get_wraps(tile_map)
+
+        # One string per target tile, containing the next move ('n', 'e', 's', 'w' or '-' if unreachable) for every
+        # state. None until the table has been loaded / built
+        self.table = None
+
+        self.maze_hash = get_maze_hash([NEXT_HOP_TABLE_VERSION, tile_map])
+        with NextHopTable.lock:
+            if self.maze_hash in NextHopTable.tables or self.maze_hash in NextHopTable.building:
+                return
+            table = local_database.get_next_hops(self.maze_hash)
+            if table is not None:
+                NextHopTable.tables[self.maze_hash] = table
+                return
+            NextHopTable.building.add(self.maze_hash)
+
+        if background:
+            threading.Thread(target=self.compile, daemon=True).start()
+        else:
+            self.compile()
+
+    def compile(self):
+        """
+        Builds the table, saves it to the database and makes it available to every NextHopTable of the maze.
+        :return: None
+        """
+
+        table = self.build()
+        local_database.save_next_hops(self.maze_hash, table)
+        with NextHopTable.lock:
+            NextHopTable.tables[self.maze_hash] = table
+            NextHopTable.building.discard(self.maze_hash)
+
+    def is_ready(self):
+        """
+        :return: True once the table has been loaded or built.
+        """
+
+        if self.table is None:
+            self.table = NextHopTable.tables.get(self.maze_hash)
+        return self.table is not None
+
+    def get_predecessors(self):
+        """
+        Works out, for every (tile, facing) state, which states can move into it in one move.
+        :return: List of predecessor state lists, indexed by state.
+        """
+
+        predecessors = []
+        for x, y in self.tiles:
+            for facing in FACINGS:
+                # To be in this state the sprite must have moved in the facing direction from the tile behind (wraps
+                # go both ways, so the tile behind is the one a move the opposite way leads to)
+                previous = self.index.get(get_neighbour(self.tile_map, self.wraps, x, y, OPPOSITES[facing]))
+                if previous is None:
+                    predecessors.append([])
+                else:
+                    predecessors.append([previous * 4 + num for num, previous_facing in enumerate(FACINGS)
+                                         if previous_facing != OPPOSITES[facing]])
+        return predecessors
+
+    def build(self):
+        """
+        Runs a reverse search from every target tile (Dijkstra's, as moving onto a tunnel tile costs TUNNEL_COST). The
+        state a state is first reached from, or reached more cheaply from, is the next move on its shortest path to the
+        target.
+        :return: List of next move strings, one per target tile.
+        """
+
+        predecessors = self.get_predecessors()
+        states = len(predecessors)
+        tunnels = get_tunnel_tiles(self.tile_map, self.wraps)
+        costs = [TUNNEL_COST if tile in tunnels else 1 for tile in self.tiles]
+
+        table = []
+        for target in range(len(self.tiles)):
+            distances = [-1] * states
+            next_moves = bytearray(b'-' * states)
+
+            # Every state on the target tile has arrived
+            queue = [(0, state) for state in range(target * 4, target * 4 + 4)]
+            for state in range(target * 4, target * 4 + 4):
+                distances[state] = 0
+
+            while queue:
+                distance, state = heapq.heappop(queue)
+                if distance > distances[state]:
+                    continue
+                move = ord(FACINGS[state % 4])
+                distance += costs[state // 4]
+                for previous in predecessors[state]:
+                    if distances[previous] == -1 or distance < distances[previous]:
+                        distances[previous] = distance
+                        next_moves[previous] = move
+                        heapq.heappush(queue, (distance, previous))
+                    elif next_moves[previous] == 45:  # ord('-')
+                        next_moves[previous] = move
+
+            table.append(next_moves.decode())
+
+        return table
+
+    def get_move(self, start, end, facing):
+        """
+        Reads the next move from the table.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Next move ('n', 'e', 's', 'w') or None if the end can't be reached.
+        """
+
+        move = self.table[self.index[end]][self.index[start] * 4 + FACINGS.index(facing)]
+        return None if move == '-' else move
+
+    def get_path(self, start, end, facing):
+        """
+        Follows the table from start to end.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        if end not in self.index or not self.is_ready():
+            return None
+
+        moves = self.table[self.index[end]]
+        path = [start]
+        x, y = start
+        while True:
+            move = moves[self.index[(x, y)] * 4 + FACINGS.index(facing)]
+            if move == '-':
+                return None
+            x, y = get_neighbour(self.tile_map, self.wraps, x, y, move)
+            facing = move
+            path.append((x, y))
+            if (x, y) == end:
+                return path
+
+    def has(self, tile):
+        """
+        :param tile: Tile (tilex, tiley).
+        :return: True if paths from the tile can be read from the table (False while it is still being built).
+        """
+
+        return tile in self.index and self.is_ready()
+
+
+class ReachabilityIndex:
+    def __init__(self, maze, wraps):
+        """
+        The tiles ghosts can target and the nearest of them to every tile in the maze, worked out once so that finding a
+        target is a single read. Targets are tiles in the main part of the maze: the largest area of pellet, power
+        pellet and empty tiles that join up (through the tunnels as well), so the ghost house and out of bounds areas
+        are left out.
+        :param maze: 2D list of the maze.
+        :param wraps: Wrap around tunnels from get_wraps.
+        """
+
+        self.maze = maze
+        self.height = len(maze)
+        self.width = max(len(row) for row in maze)
+
+        # Splitting the open tiles into areas that join up, and keeping the largest
+        open_tiles = {(x, y) for y, row in enumerate(maze) for x, data in enumerate(row) if data in (0, 2, 4)}
+        self.reachable = set()
+        found = set()
+        for y, row in enumerate(maze):
+            for x in range(len(row)):
+                if (x, y) not in open_tiles or (x, y) in found:
+                    continue
+                area = {(x, y)}
+                queue = deque(area)
+                while queue:
+                    tile_x, tile_y = queue.popleft()
+                    for move in FACINGS:
+                        tile = get_neighbour(maze, wraps, tile_x, tile_y, move)
+                        if tile in open_tiles and tile not in area:
+                            area.add(tile)
+                            queue.append(tile)
+                found |= area
+                if len(area) > len(self.reachable):
+                    self.reachable = area
+
+        # Nearest target to every tile (walls included), from a breadth first search out of every target at once
+        self.nearest = [[None] * self.width for _ in range(self.height)]
+        queue = deque()
+        for y, row in enumerate(maze):
+            for x in range(len(row)):
+                if (x, y) in self.reachable:
+                    self.nearest[y][x] = (x, y)
+                    queue.append((x, y))
+        while queue:
+            x, y = queue.popleft()
+            for move in FACINGS:
+                dx, dy = VECTORS[move]
+                if 0 <= y + dy < self.height and 0 <= x + dx < self.width and self.nearest[y + dy][x + dx] is None:
+                    self.nearest[y + dy][x + dx] = self.nearest[y][x]
+                    queue.append((x + dx, y + dy))
+
+    def is_reachable(self, tile):
+        """
+        :param tile: (tilex, tiley).
+        :return: True if ghosts can target the tile.
+        """
+
+        return tuple(tile) in self.reachable
+
+    def get_nearest(self, tile):
+        """
+        Finds the nearest tile that ghosts can target. Tiles outside the maze are moved onto its edge first.
+        :param tile: (tilex, tiley), can be outside the maze.
+        :return: (tilex, tiley), or None if there are no targets in the maze.
+        """
+
+        x = min(max(tile[0], 0), self.width - 1)
+        y = min(max(tile[1], 0), self.height - 1)
+        return self.nearest[y][x]
+
+
 class Node:
+    # Searches make a lot of nodes, so they don't get a __dict__
+    __slots__ = ('x', 'y', 'parent', 'f_score', 'h_score', 'g_score', 'facing')
+
     def __init__(self, x, y, facing, parent=None):
         """
         Every tile in a path (or possible path) is called a node. It has tilex and tiley values and also stores the
@@ -62,16 +754,37 @@ class Node:
 
     def get_path(self, path):
         """
-        Recursive algorithm to get the path once the target node has been reached.
+        Gets the path once the target node has been reached, by following the parents back to the start.
         :param path: Path so far
-        :return: Path with self added.
+        :return: Path with the nodes up to and including self added.
         """
 
-        if self.parent is not None:
-            path = self.parent.get_path(path)
-        path.append((self.x, self.y))
+        tiles = []
+        node = self
+        while node is not None:
+            tiles.append((node.x, node.y))
+            node = node.parent
+        tiles.reverse()
+        path.extend(tiles)
         return path
 
+    def get_route(self, route):
+        """
+        Gets the route (including the facing at each node) once the target node has been reached, by following the
+        parents back to the start.
+        :param route: Route so far
+        :return: Route with the nodes up to and including self added.
+        """
+
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append((node.x, node.y, node.facing))
+            node = node.parent
+        nodes.reverse()
+        route.extend(nodes)
+        return route
+
 
 class Tile:
     def __init__(self, tile_x, tile_y, _type, win_scale, skin):
@@ -142,10 +855,26 @@ class Maze:
         """
 
         self.tile_map = get_maze(maze_id)
+        self.wraps = get_wraps(self.tile_map)
+        # Walkable tiles and the moves out of them, and the tiles ghosts can change direction on. Shared by every sprite
+        self.board = WalkableBoard(self.tile_map, self.wraps)
+        self.tunnels = self.board.tunnels
+        self.junctions = self.board.get_junctions()
+        self.next_hops = None
+        if sum(tile != 1 for row in self.tile_map for tile in row) <= NEXT_HOP_TABLE_MAX_TILES:
+            self.next_hops = NextHopTable(self.tile_map)
+        # Tiles ghosts can target, shared by every ghost in the maze
+        self.reachability = ReachabilityIndex(self.tile_map, self.wraps)
         self.win_scale = win_scale
-        self.tiles = self.get_tiles('blue')
+        self.wall_skins = load_wall_skins(maze_id, self.tile_map)
         self.skin_colour = 'blue'
 
+        # Tiles in each skin colour, and the tiles drawn onto a surface of the whole maze. Both colours are loaded
+        # now, so that the maze can flash at the end of a level without loading anything
+        self.tile_sets = {}
+        self.surfaces = {}
+        self.load_skins()
+
     def get_tiles(self, skin_colour):
         """
         Gets list off tile objects based on the tile_map.
@@ -158,13 +887,13 @@ class Maze:
             tiles.append([])
             for x, data in enumerate(row):
                 if data == 1:
-                    skin_name = f'{self.get_skin(x, y, self.tile_map)}.png'
+                    skin_name = f'{self.wall_skins[y][x]}.png'
                     skin_address = os.path.join('Resources', 'sprites', 'walls', skin_colour, skin_name)
-                    skin = pg.transform.scale(pg.image.load(skin_address), (12 * self.win_scale, 12 * self.win_scale))
+                    skin = assets.get_image(skin_address, (12 * self.win_scale, 12 * self.win_scale))
 
                 elif data == 3:
                     skin_address = os.path.join('Resources', 'sprites', 'walls', skin_colour, 'ghost_barrier.png')
-                    skin = pg.transform.scale(pg.image.load(skin_address), (12 * self.win_scale, 12 * self.win_scale))
+                    skin = assets.get_image(skin_address, (12 * self.win_scale, 12 * self.win_scale))
                 else:
                     skin = None
                 tiles[y].append(Tile(x, y + 3, data, self.win_scale, skin))
@@ -181,185 +910,45 @@ class Maze:
             self.skin_colour = 'white'
         else:
             self.skin_colour = 'blue'
-        self.tiles = self.get_tiles(self.skin_colour)
+        self.tiles = self.tile_sets[self.skin_colour]
 
     def display(self, win):
         """
-        Displays the maze, by displaying each individual tile.
+        Displays the maze, by blitting the surface for the current skin colour.
         :param win: The current window, all objects must be blitted to this window to be displayed.
         :return: None
         """
 
-        for row in self.tiles:
-            for tile in row:
-                tile.display(win)
-
-    # noinspection PyMethodMayBeStatic
-    def get_skin(self, tile_x, tile_y, tile_map):
-        """
-        Works out what skin each tile should have based on the type of tile in the surrounding 8 spaces.
-        :param tile_x: x coord of tile.
-        :param tile_y: y coord of tile.
-        :param tile_map: The 2D list of tiles from the maze json file.
-        :return: String name of skin for the tile specified by the x, y position.
-        """
-
-        tile_map = [[0 if x == 2 else x for x in row] for row in tile_map]
-
-        # get adjacency list
-        adjacent = {}
-        vectors = {'s': (0, 1),
-                   'e': (1, 0),
-                   'w': (-1, 0),
-                   'n': (0, -1),
-                   'ne': (1, -1),
-                   'se': (1, 1),
-                   'sw': (-1, 1),
-                   'nw': (-1, -1)
-                   }
-
-        for key, value in vectors.items():
-            x, y = value
-            try:
-                new_x = tile_x + x
-                new_y = tile_y + y
-
-                if new_x < 0 or new_y < 0:
-                    adjacent.update({key: None})
-                    continue
-
-                adjacent.update({key: tile_map[tile_y + y][tile_x + x]})
-            except IndexError:
-                adjacent.update({key: None})
-
-        values = tuple(list(adjacent.values())[:4])
-        values_diag = tuple(adjacent.values())
-
-        # ghost edges
-        if values == (4, 3, 1, 4):
-            return 'left_end_ghost'
-
-        if values == (4, 1, 3, 4):
-            return 'right_end_ghost'
-
-        if values == (4, 1, 1, 4) and tile_y == 12:
-            return 'lower_boundary'
-
-        if values == (4, 1, 1, 4) and tile_y == 16:
-            return 'upper_boundary'
-
-        if values == (1, 4, 4, 1) and tile_x == 10:
-            return 'right_boundary'
-
-        if values == (1, 4, 4, 1) and tile_x == 17:
-            return 'left_boundary'
-
-        # ghost corners
-        if values_diag == (1, 1, 4, 4, 4, 4, 4, 4):
-            return 'left_upper_corner_ghost'
-
-        if values_diag == (1, 4, 1, 4, 4, 4, 4, 4):
-            return 'right_upper_corner_ghost'
-
-        if values_diag == (4, 4, 1, 1, 4, 4, 4, 4):
-            return 'right_lower_corner_ghost'
-
-        if values_diag == (4, 1, 4, 1, 4, 4, 4, 4):
-            return 'left_lower_corner_ghost'
-
-        # boundaries edges
-        values_temp = tuple([1 if x is None else x for x in values])
-
-        if values == (0, 1, 1, None) or values == (0, 1, 1, 5) or values_temp == (4, 1, 1, 5):
-            return 'upper_boundary'
+        win.blit(self.surfaces[self.skin_colour], (0, 3 * 12 * self.win_scale))
 
-        if values == (None, 1, 1, 0) or values == (5, 1, 1, 0) or values_temp == (5, 1, 1, 4):
-            return 'lower_boundary'
-
-        if values == (1, 0, None, 1) or values == (1, 0, 4, 1) or values == (1, 0, 5, 1):
-            return 'left_boundary'
-
-        if values == (1, None, 0, 1) or values == (1, 4, 0, 1) or values == (1, 5, 0, 1):
-            return 'right_boundary'
-
-        # boundary spits
-        if values_diag == (1, 1, 1, None, None, 1, 0, None):
-            return 'upper_left_spit_boundary'
-
-        if values_diag == (1, 1, 1, None, None, 0, 1, None):
-            return 'upper_right_spit_boundary'
-
-        if values_diag == (None, 1, 1, 1, 1, None, None, 0):
-            return 'lower_left_spit_boundary'
-
-        if values_diag == (None, 1, 1, 1, 0, None, None, 1):
-            return 'lower_right_spit_boundary'
-
-        if values_diag == (1, None, 1, 1, None, None, 1, 0):
-            return 'right_upper_spit_boundary'
-
-        if values_diag == (1, None, 1, 1, None, None, 0, 1):
-            return 'right_lower_spit_boundary'
-
-        if values_diag == (1, 1, None, 1, 1, 0, None, None):
-            return 'left_lower_spit_boundary'
-
-        if values_diag == (1, 1, None, 1, 0, 1, None, None):
-            return 'left_upper_spit_boundary'
-
-        # boundary corners
-        if values == (1, 1, None, None) or values == (1, 1, None, 5):
-            return 'left_upper_boundary'
-
-        if values == (1, None, 1, None) or values == (1, None, 1, 5):
-            return 'right_upper_boundary'
-
-        if values == (None, None, 1, 1) or values == (5, None, 1, 1):
-            return 'right_lower_boundary'
-
-        if values == (None, 1, None, 1) or values == (5, 1, None, 1):
-            return 'left_lower_boundary'
-
-        # corners
-        values_temp = tuple([0 if x == 4 else x for x in values])
-        values_diag_temp = tuple([0 if x == 4 else x for x in values_diag])
-
-        if values_temp == (1, 1, 0, 0):
-            return 'left_upper_corner'
-
-        if values_temp == (1, 0, 1, 0):
-            return 'right_upper_corner'
-
-        if values_temp == (0, 1, 0, 1):
-            return 'left_lower_corner'
-
-        if values_temp == (0, 0, 1, 1):
-            return 'right_lower_corner'
-
-        if values_diag_temp == (1, 1, 1, 1, 1, 0, 1, 1):
-            return 'left_upper_inside_corner'
-
-        if values_diag_temp == (1, 1, 1, 1, 1, 1, 0, 1):
-            return 'right_upper_inside_corner'
-
-        if values_diag_temp == (1, 1, 1, 1, 0, 1, 1, 1):
-            return 'left_lower_inside_corner'
-
-        if values_diag_temp == (1, 1, 1, 1, 1, 1, 1, 0):
-            return 'right_lower_inside_corner'
+    def load_skins(self):
+        """
+        Loads the tiles in both skin colours and draws each set onto a surface.
+        :return: None
+        """
 
-        # edges
-        values_temp = tuple([1 if x == 6 else x for x in [0 if x == 4 else x for x in values]])
-        if values_temp == (1, 1, 1, 0):
-            return 'upper_edge'
+        for skin_colour in ('blue', 'white'):
+            self.tile_sets[skin_colour] = self.get_tiles(skin_colour)
+            self.surfaces[skin_colour] = self.get_surface(self.tile_sets[skin_colour])
+        self.tiles = self.tile_sets[self.skin_colour]
 
-        if values_temp == (1, 1, 0, 1):
-            return 'right_edge'
+    def get_surface(self, tiles):
+        """
+        Draws every tile onto one surface, so that the maze can be displayed with a single blit.
+        :param tiles: 2D list of tile objects.
+        :return: Surface of the maze (the top left tile is at (0, 0)).
+        """
 
-        if values_temp == (0, 1, 1, 1):
-            return 'lower_edge'
+        width = max((len(row) for row in self.tile_map), default=0)
+        surface = pg.Surface((width * 12 * self.win_scale, len(self.tile_map) * 12 * self.win_scale))
 
-        if values_temp == (1, 0, 1, 1):
-            return 'left_edge'
+        # Tiles are positioned below the score bar, the surface is blitted there instead
+        offset = (0, -3 * 12 * self.win_scale)
+        for row in tiles:
+            for tile in row:
+                if tile.type in ['wall', 'ghost_barrier']:
+                    surface.blit(tile.skin, tile.rect.move(offset))
+                else:
+                    pg.draw.rect(surface, tile.colour, tile.rect.move(offset))
 
-        return 'temp'
+        return surface
@@ -1,7 +1,127 @@
 __author__ = 'Will Evans'
+import assets
 import pygame as pg
 import os.path
 import sprites
+import window
+
+# Fonts already opened, keyed by (font file, size, italic, bold). Opening a font reads the whole file, so each one is
+# only opened once
+fonts = {}
+
+# Characters rendered once per (font file, size, italic, bold, colour), so that numbers can be drawn without rendering
+glyph_atlases = {}
+
+# Characters in a glyph atlas
+GLYPHS = '0123456789'
+
+# Layers of each LiveLetter (text, black outline and highlight outline), keyed by (letter, size, highlight colour), so
+# that menus can be made again without rendering
+live_letters = {}
+
+# Line wrapping of each tutorial prompt, keyed by (prompt, font size, max length), so that each prompt is only measured
+# once however many times its text box is made
+text_layouts = {}
+
+
+def get_font(font_path, font_size, italic=False, bold=False):
+    """
+    Returns a font, opening it if it hasn't been opened before. The font is shared, so its style must not be changed.
+    :param font_path: Path of the font file.
+    :param font_size: Font size (already multiplied by win_scale).
+    :param italic: Boolean: italics or not.
+    :param bold: Boolean: bold or not.
+    :return: Font object.
+    """
+
+    key = (font_path, font_size, italic, bold)
+    if key not in fonts:
+        font = pg.font.Font(font_path, font_size)
+        font.set_italic(italic)
+        font.set_bold(bold)
+        fonts[key] = font
+    return fonts[key]
+
+
+def get_glyphs(font_path, font_size, colour, italic=False, bold=False):
+    """
+    Returns every character in GLYPHS rendered in a font and colour, rendering them if they haven't been already.
+    :param font_path: Path of the font file.
+    :param font_size: Font size (already multiplied by win_scale).
+    :param colour: (r, g, b) value of colour.
+    :param italic: Boolean: italics or not.
+    :param bold: Boolean: bold or not.
+    :return: Dictionary of {character: Surface}.
+    """
+
+    key = (font_path, font_size, italic, bold, tuple(colour))
+    if key not in glyph_atlases:
+        font = get_font(font_path, font_size, italic, bold)
+        glyph_atlases[key] = {glyph: font.render(glyph, True, colour) for glyph in GLYPHS}
+    return glyph_atlases[key]
+
+
+def get_live_letter(letter, font_size, highlight_colour):
+    """
+    Returns the three layers of a LiveLetter, rendering them if they haven't been already.
+    :param letter: The letter.
+    :param font_size: Font size (already multiplied by win_scale).
+    :param highlight_colour: (r, g, b) colour of the highlighted part of the letter.
+    :return: (text, black outline, highlight outline) Surfaces.
+    """
+
+    key = (letter, font_size, tuple(highlight_colour))
+    if key not in live_letters:
+        font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
+        text = get_font(font_path, font_size).render(letter, True, (255, 255, 30))
+        outline1 = get_font(font_path, int(font_size * 54 / 50)).render(letter, True, pg.Color('black'))
+        outline = get_font(font_path, int(font_size * 62 / 50)).render(letter, True, highlight_colour)
+        live_letters[key] = (text, outline1, outline)
+    return live_letters[key]
+
+
+def get_text_layout(content, font_size, max_length):
+    """
+    Returns how a tutorial prompt is split into boxes of up to three lines, working it out if it hasn't been already. A
+    new line is started before a word that would take the line past the max length, and a new box after a word ending
+    in '...'.
+    :param content: The prompt.
+    :param font_size: Font size (not multiplied by win_scale, the layout is the same for every window scale).
+    :param max_length: Width a line must stay under.
+    :return: List of boxes, each a list of line strings.
+    """
+
+    key = (content, font_size, max_length)
+    if key not in text_layouts:
+        font = get_font(os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF'), font_size)
+        words = [f'{word}  ' for word in content.split(' ')]
+        boxes = []
+
+        while len(words) > 0:
+            content_buffer = ''
+            lines = []
+
+            for word in words:
+                content_buffer += word
+                words = words[1:]
+
+                if len(words) == 0:
+                    lines.append(content_buffer)
+                    break
+
+                current_length = font.size(content_buffer)[0] + font.size(words[0])[0]
+                ellipsis_exit = word.replace(' ', '')[:-4:-1] == '...'
+                if current_length >= max_length or ellipsis_exit:
+                    lines.append(content_buffer)
+                    content_buffer = ''
+
+                if len(lines) == 3 or ellipsis_exit:
+                    break
+
+            boxes.append(lines)
+
+        text_layouts[key] = boxes
+    return text_layouts[key]
 
 
 class Word:
@@ -30,23 +150,32 @@ class Word:
         self.left = left
         self.__letters = []
 
-        font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
-        self._font = pg.font.Font(font_path, font_size * win_scale)
-        self._font.set_italic(italic)
-        self._font.set_bold(bold)
+        self._font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
+        self._font_size = font_size * win_scale
+        self._italic = italic
+        self._bold = bold
+        self._font = get_font(self._font_path, self._font_size, italic, bold)
 
         if self.content is not None:
             self.render()
 
-    def display(self, win):
+    def display(self, win, area=None):
         """
         Blits the rendered font to the screen as per the rect.
         :param win: The current window, all objects must be blitted to this window to be displayed.
+        :param area: Rect of the part of the rendered font to blit (all of it if None).
         :return: None
         """
 
         if self.content is not None:
-            win.blit(self._rendered_text, self._text_rect)
+            win.blit(self._rendered_text, self._text_rect, area)
+
+    def get_rect(self):
+        """
+        :return: Rect that the rendered font is blitted to.
+        """
+
+        return self._text_rect
 
     def render(self):
         """
@@ -65,6 +194,80 @@ class Word:
             self._text_rect = self._rendered_text.get_rect(midright=(self.x, self.y))
 
 
+class NumberWord(Word):
+    def __init__(self, number, pos, colour, font_size, win_scale, italic=False, bold=False, centre=False, left=False):
+        """
+        Word for numbers that change often (e.g. scores). The digits are rendered once and shared by every NumberWord
+        in the same font and colour, so changing the number only moves the digits around.
+        :param number: Integer: number to display.
+        :param pos: (x, y) position of word.
+        :param colour: (r, g, b) value of colour.
+        :param font_size: Font size.
+        :param win_scale: Window Scale (How large the window is - must be multiplied by all size related variables).
+        :param italic: Boolean: italics or not.
+        :param bold: Boolean: bold or not.
+        :param centre: Boolean: centre or not.
+        :param left: Boolean: align left or not.
+        """
+
+        super().__init__(None, pos, colour, font_size, win_scale, italic, bold, centre, left)
+        self._glyphs = get_glyphs(self._font_path, self._font_size, colour, italic, bold)
+        self._glyph_rects = []
+        self.set_number(number)
+
+    def set_number(self, number):
+        """
+        Changes the number displayed, only working out where the digits go if it has changed.
+        :param number: Integer: number to display.
+        :return: None
+        """
+
+        content = str(number)
+        if content != self.content:
+            self.content = content
+            self.render()
+
+    def display(self, win):
+        """
+        Blits each digit to the screen.
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :return: None
+        """
+
+        for glyph, rect in self._glyph_rects:
+            win.blit(glyph, rect)
+
+    def render(self):
+        """
+        Works out where each digit goes, based on the position and alignment instructions.
+        :return: None
+        """
+
+        if any(character not in self._glyphs for character in self.content):
+            # Anything other than digits is rendered like a normal Word
+            super().render()
+            self._glyph_rects = [(self._rendered_text, self._text_rect)]
+            return
+
+        glyphs = [self._glyphs[character] for character in self.content]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max(glyph.get_height() for glyph in glyphs)
+
+        self._text_rect = pg.Rect(0, 0, width, height)
+        if self.centre:
+            self._text_rect.center = (self.x, self.y)
+        elif self.left:
+            self._text_rect.midleft = (self.x, self.y)
+        else:
+            self._text_rect.midright = (self.x, self.y)
+
+        self._glyph_rects = []
+        x = self._text_rect.x
+        for glyph in glyphs:
+            self._glyph_rects.append((glyph, glyph.get_rect(topleft=(x, self._text_rect.y))))
+            x += glyph.get_width()
+
+
 class LiveWord:
     def __init__(self, content, y, font_size, win_scale, highlight_colour=(255, 255, 255)):
         """
@@ -160,18 +363,12 @@ class LiveLetter:
         self.x = x * win_scale
         self.y = y * win_scale
 
-        font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
+        # The layers are shared by every LiveLetter with the same letter, size and colour
+        self.__rendered_text, self.__rendered_outline1, self.__rendered_outline = get_live_letter(
+            letter, self.__font_size, highlight_colour)
 
-        self.__font = pg.font.Font(font_path, self.__font_size)
-        self.__rendered_text = self.__font.render(letter, True, (255, 255, 30))
         self.__text_rect = self.__rendered_text.get_rect(center=(self.x, self.y))
-
-        self.__outline1 = pg.font.Font(font_path, int(self.__font_size * 54 / 50))
-        self.__rendered_outline1 = self.__outline1.render(letter, True, pg.Color('black'))
         self.__outline1_rect = self.__rendered_outline1.get_rect(center=(self.x, self.y))
-
-        self.__outline = pg.font.Font(font_path, int(self.__font_size * 62 / 50))
-        self.__rendered_outline = self.__outline.render(letter, True, highlight_colour)
         self.__outline_rect = self.__rendered_outline.get_rect(center=(self.x, self.y))
 
     def display(self, react, win):
@@ -208,8 +405,9 @@ class LiveLetter:
 class ScrollingWord:
     def __init__(self, content, pos, colour, font_size, win_scale, frame_cap=1):
         """
-        Scrolling words uses the word class (constantly re renders it) to give the appearance of scrolling / revealing
-        text.
+        Scrolling words use the word class to give the appearance of scrolling / revealing text. The whole word is
+        rendered once and only the part that has been revealed is blitted, so revealing a character costs the same
+        however long the word is.
         :param content: String: content of the word.
         :param pos: (x, y) position of word.
         :param colour: (r, g, b) value of colour.
@@ -218,11 +416,16 @@ class ScrollingWord:
         """
 
         self.content = content
-        self.content_displayed = ''
         self.characters_displayed_num = 0
         self.finished = False
 
-        self.rendered_font = Word(self.content_displayed, pos, colour, font_size, win_scale, False, False, False, True)
+        self.rendered_font = Word(self.content, pos, colour, font_size, win_scale, False, False, False, True)
+
+        # Width of the rendered font taken up by the first n characters (measured rather than added up character by
+        # character, as the font's advances aren't whole pixels)
+        font = get_font(self.rendered_font._font_path, self.rendered_font._font_size)
+        self.widths = [font.size(self.content[:num])[0] for num in range(len(self.content) + 1)]
+        self.area = pg.Rect(0, 0, 0, font.get_height())
 
         self.frame_count = 0
         self.frame_cap = frame_cap
@@ -232,22 +435,18 @@ class ScrollingWord:
         if self.frame_count == self.frame_cap:
             self.frame_count = 0
 
-            if self.content == self.content_displayed:
+            if self.characters_displayed_num == len(self.content):
                 self.finished = True
             else:
-                self.content_displayed += self.content[self.characters_displayed_num]
                 self.characters_displayed_num += 1
-                self.rendered_font.content = self.content_displayed
-                self.rendered_font.render()
+                self.area.width = self.widths[self.characters_displayed_num]
 
     def display(self, win):
-        self.rendered_font.display(win)
+        self.rendered_font.display(win, self.area)
 
     def render_all(self):
-        self.content_displayed = self.content
         self.characters_displayed_num = len(self.content)
-        self.rendered_font.content = self.content_displayed
-        self.rendered_font.render()
+        self.area.width = self.widths[self.characters_displayed_num]
 
 
 class TutorialTextBox:
@@ -269,23 +468,14 @@ class TutorialTextBox:
         self.add_mspacman = add_mspacman
 
         # Words
-        self.content = [f'{word}  ' for word in content.split(' ')]
-        self.content_remaining = self.content
+        self.content = content
         self.colour = colour
         self.win_scale = win_scale
         self.font_size = 20
         self.x_prespacing = 15 if not self.add_mspacman else 80
         self.max_length = 340 - self.x_prespacing
 
-        # This is a lovely trick to calculate how long the text will be (so that we know when to use a newline). By
-        # rendering the font here we can use this object to get the width.
-        font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
-        self.font = pg.font.Font(font_path, self.font_size)
-
-        self.boxes = []
-
-        while len(self.content_remaining) > 0:
-            self.render_box()
+        self.boxes = [self.render_box(lines) for lines in get_text_layout(content, self.font_size, self.max_length)]
 
         self.active_box_index = 0
         self.active_box = self.boxes[self.active_box_index]
@@ -353,42 +543,16 @@ class TutorialTextBox:
         if self.add_mspacman:
             self.mspacman.display(win)
 
-    def render_box(self):
-        content_buffer = ''
-        line_num = 0
-        lines = []
-
-        for word in self.content_remaining:
-            content_buffer += word
-            self.content_remaining = self.content_remaining[1:]
-
-            if len(self.content_remaining) == 0:
-                lines.append(
-                    ScrollingWord(content_buffer, (self.x_prespacing, 375 + 15 * line_num), self.colour, self.font_size,
-                                  self.win_scale, 2))
+    def render_box(self, lines):
+        """
+        Makes a scrolling word for each line of a box.
+        :param lines: List of line strings (from get_text_layout).
+        :return: List of ScrollingWords.
+        """
 
-                self.boxes.append(lines)
-                break
-
-            current_length = self.font.size(content_buffer)[0] + self.font.size(self.content_remaining[0])[0]
-            ellipsis_exit = word.replace(' ', '')[:-4:-1] == '...'
-            if current_length >= self.max_length or ellipsis_exit:
-                lines.append(
-                    ScrollingWord(content_buffer,
-                                  (self.x_prespacing,
-                                   375 + 15 * line_num),
-                                  self.colour,
-                                  self.font_size,
-                                  self.win_scale,
-                                  2)
-                        )
-
-                line_num += 1
-                content_buffer = ''
-
-            if line_num == 3 or ellipsis_exit:
-                self.boxes.append(lines)
-                break
+        return [ScrollingWord(line, (self.x_prespacing, 375 + 15 * line_num), self.colour, self.font_size,
+                              self.win_scale, 2)
+                for line_num, line in enumerate(lines)]
 
 
 class Box:
@@ -494,7 +658,7 @@ class InputBox:
         self.user_input = ''
 
         font_path = os.path.join('resources', 'fonts', 'ARCADECLASSIC.TTF')
-        self.__font = pg.font.Font(font_path, font_size * win_scale)
+        self.__font = get_font(font_path, font_size * win_scale)
         self.text_surface = self.__font.render(self.display_text, True, self.text_color)
         self.text_rect = self.text_surface.get_rect(center=self.text_box_rect.center)
 
@@ -684,7 +848,7 @@ class Button:
         :return: None
         """
 
-        pos = pg.mouse.get_pos()
+        pos = window.get_mouse_pos()
         collision = self.check_mouse(*pos)
         click = False
         for event in events:
@@ -804,7 +968,7 @@ class Slider:
         :return: None.
         """
 
-        pos = pg.mouse.get_pos()
+        pos = window.get_mouse_pos()
         collision = self.check_mouse(*pos)
         click = False
         if pg.mouse.get_pressed()[0]:
@@ -911,7 +1075,7 @@ class Icon:
             pg.mixer.music.play()
 
         x, y = pos
-        self._imgs = [pg.transform.smoothscale(pg.image.load(img), (25 * win_scale, 25 * win_scale)) for img in imgs]
+        self._imgs = [assets.get_image(img, (25 * win_scale, 25 * win_scale), smooth=True) for img in imgs]
         self._rect = self._imgs[0].get_rect(bottomright=(x * win_scale, y * win_scale))
         self._image_num = 0
 
@@ -950,3 +1114,102 @@ class Icon:
             else:
                 pg.mixer.music.unpause()
                 self.sound_toggle = True
+
+
+class DirtyRenderer:
+    def __init__(self, background):
+        """
+        Keeps track of the parts of the window that change each frame, so that only those parts have to be redrawn and
+        updated. Anything that doesn't move (e.g. the maze) is drawn once onto the background, which is used to rub out
+        whatever was drawn over it the frame before.
+        :param background: Surface the size of the window.
+        :type background: Surface.
+        """
+
+        self.background = background
+        self.window_rect = background.get_rect()
+
+        # Rects drawn over the background last frame and this frame
+        self.previous_rects = []
+        self.rects = []
+
+        # The whole window is drawn when the renderer is first used, or after something else has drawn over it
+        self.full_redraw = True
+        self.redrawn = False
+
+    def redraw(self):
+        """
+        Makes the whole background be drawn next frame. Run when the background changes, or the window has been drawn
+        over without the renderer knowing.
+        :return: None
+        """
+
+        self.full_redraw = True
+
+    def clear(self, win):
+        """
+        Rubs out everything drawn last frame by blitting the background over it. Run at the start of each frame.
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :type win: Surface.
+        :return: None
+        """
+
+        self.redrawn = self.full_redraw
+        if self.full_redraw:
+            win.blit(self.background, (0, 0))
+            self.full_redraw = False
+        else:
+            for rect in self.rects:
+                win.blit(self.background, rect, rect)
+
+        self.previous_rects = self.rects
+        self.rects = []
+
+    def add(self, rect):
+        """
+        Marks part of the window as changed, it will be updated this frame and rubbed out next frame.
+        :param rect: Rect that has been drawn to.
+        :type rect: Rect.
+        :return: None
+        """
+
+        rect = self.window_rect.clip(rect)
+        if rect.width and rect.height:
+            self.rects.append(rect)
+
+    def draw(self, win, item, rect):
+        """
+        Displays an object (anything with a display(win) method) and marks its rect as changed.
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :type win: Surface.
+        :param item: Object to display.
+        :param rect: Rect the object is displayed in.
+        :type rect: Rect.
+        :return: None
+        """
+
+        item.display(win)
+        self.add(rect)
+
+    def restore(self, win, rect):
+        """
+        Blits part of the background to the window straight away. Run after that part of the background has changed
+        (e.g. a pellet has been eaten).
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :type win: Surface.
+        :param rect: Rect of the background to blit.
+        :type rect: Rect.
+        :return: None
+        """
+
+        win.blit(self.background, rect, rect)
+        self.add(rect)
+
+    def get_dirty_rects(self):
+        """
+        :return: List of the rects that have changed on the window this frame (what was rubbed out and what was drawn).
+        """
+
+        if self.full_redraw or self.redrawn:
+            return [self.window_rect]
+        return self.previous_rects + self.rects
@@ -130,22 +130,62 @@ def create_mazes(cursor):
         query(sql, (maze,))
 
 
+def create_next_hop_tables(cursor):
+    """
+    Creates table 'NextHopTables'. IF NOT EXISTS as it was added after the other tables, so databases made before it
+    need it adding.
+    :param cursor: Object used to execute SQL within the database.
+    :return: None
+    """
+
+    sql = """CREATE TABLE IF NOT EXISTS NextHopTables
+                          (MazeHash TEXT,
+                           NextHops TEXT,
+                           PRIMARY KEY(MazeHash))
+            """
+    cursor.execute(sql)
+
+
+def create_wall_skins(cursor):
+    """
+    Creates table 'WallSkins' if it doesn't already exist (it was added after the other tables, so it may be missing
+    from existing databases).
+    :param cursor: Object used to execute SQL within the database.
+    :return: None
+    """
+
+    sql = """CREATE TABLE IF NOT EXISTS WallSkins
+                          (MazeID INTEGER,
+                           MazeHash TEXT,
+                           Skins TEXT,
+                           PRIMARY KEY(MazeID),
+                           FOREIGN KEY(MazeID) REFERENCES Mazes(MazeID))
+            """
+    cursor.execute(sql)
+
+
 def create_db():
     """
     Checks whether the database has already been created and if not creates it.
     :return: None
     """
 
-    if not os.path.exists('data\\database.db'):
-        with sqlite3.connect('data\\database.db') as db:
-            cursor = db.cursor()
+    db_path = os.path.join('data', 'database.db')
+    new_db = not os.path.exists(db_path)
 
+    with sqlite3.connect(db_path) as db:
+        cursor = db.cursor()
+
+        if new_db:
             create_users(cursor)
             create_game_level(cursor)
             create_game_history(cursor)
             create_multiplayer_game_history(cursor)
             create_mazes(cursor)
 
+        create_next_hop_tables(cursor)
+        create_wall_skins(cursor)
+
 
 def query(sql, data=None):
     """
@@ -282,6 +322,110 @@ def get_maze(maze_id):
     return query(sql, (maze_id,))[0][0]
 
 
+def get_mazes():
+    """
+    Returns every maze in the database.
+    :return: List of (MazeID, Maze) tuples, where Maze is the JSON string of the 2D maze.
+    """
+
+    sql = """
+          SELECT MazeID, Maze
+          FROM Mazes
+          """
+
+    return query(sql)
+
+
+def get_next_hops(maze_hash):
+    """
+    Returns the compiled next hop table for a maze if it has been saved before.
+    :param maze_hash: Hash of the maze contents (see datastructures.get_maze_hash).
+    :return: List of next move strings or None if the table hasn't been built yet.
+    """
+
+    sql = """
+          SELECT NextHops
+          FROM NextHopTables
+          WHERE MazeHash=?
+          """
+
+    try:
+        results = query(sql, (maze_hash,))
+    except sqlite3.Error:
+        return None
+
+    if len(results) == 0:
+        return None
+    return json.loads(results[0][0])
+
+
+def save_next_hops(maze_hash, next_hops):
+    """
+    Saves a compiled next hop table so that it doesn't have to be built again.
+    :param maze_hash: Hash of the maze contents (see datastructures.get_maze_hash).
+    :param next_hops: List of next move strings.
+    :return: None
+    """
+
+    sql = """
+          INSERT OR REPLACE INTO NextHopTables
+          (MazeHash, NextHops)
+          VALUES (?, ?)
+          """
+
+    # The table is only a cache, so if it can't be saved it is just built again next launch
+    try:
+        query(sql, (maze_hash, json.dumps(next_hops)))
+    except sqlite3.Error:
+        pass
+
+
+def get_wall_skins(maze_id, maze_hash):
+    """
+    Returns the wall skins of a maze if they have been saved before.
+    :param maze_id: MazeID.
+    :param maze_hash: Hash of the maze contents (see datastructures.get_maze_hash), in case the maze has changed.
+    :return: 2D list of skin names or None if they haven't been worked out yet.
+    """
+
+    sql = """
+          SELECT Skins
+          FROM WallSkins
+          WHERE MazeID=? AND MazeHash=?
+          """
+
+    try:
+        results = query(sql, (maze_id, maze_hash))
+    except sqlite3.Error:
+        return None
+
+    if len(results) == 0:
+        return None
+    return json.loads(results[0][0])
+
+
+def save_wall_skins(maze_id, maze_hash, skins):
+    """
+    Saves the wall skins of a maze so that they don't have to be worked out again.
+    :param maze_id: MazeID.
+    :param maze_hash: Hash of the maze contents (see datastructures.get_maze_hash).
+    :param skins: 2D list of skin names.
+    :return: None
+    """
+
+    sql = """
+          INSERT OR REPLACE INTO WallSkins
+          (MazeID, MazeHash, Skins)
+          VALUES (?, ?, ?)
+          """
+
+    # The skins are only a cache, so if they can't be saved they are just worked out again next launch
+    try:
+        query(sql, (maze_id, maze_hash, json.dumps(skins)))
+    except sqlite3.Error:
+        pass
+
+
 def login(username, password):
     """
     Checks user provided details against database.
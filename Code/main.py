@@ -9,20 +9,19 @@ import pygame as pg
 import single_player
 import splash_screens
 import tutorial
+import window
 
 
 def create_window(win_scale):
-    x = int(28 * 12 * win_scale)
-    y = int(36 * 12 * win_scale)
+    screen = window.create_window(win_scale)
 
-    win = pg.display.set_mode((x, y))
     # noinspection PyUnresolvedReferences
     icon_path = os.path.join('Resources', 'pacman.gif')
     icon = pg.image.load(icon_path)
     pg.display.set_icon(icon)
     pg.display.set_caption('Pac Man')
 
-    return win
+    return screen
 
 
 if __name__ == '__main__':
@@ -41,7 +40,10 @@ if __name__ == '__main__':
     clock = pg.time.Clock()
 
     # Creates window
-    win = create_window(win_scale)
+    create_window(win_scale)
+
+    # Every program draws onto the logical surface (at LOGICAL_SCALE), which is upscaled to the window each frame
+    win = pg.Surface(window.LOGICAL_SIZE).convert()
 
     # Creates database
     local_database.create_db()
@@ -69,7 +71,7 @@ if __name__ == '__main__':
     # Essential information for starting the game
     program_name = 'StartScreen'
     program = programmes[program_name]
-    running_program = program(win, win_scale, user_id)
+    running_program = program(win, window.LOGICAL_SCALE, user_id)
 
     # Information on error messages (these must be stored in the main script).
     error_message = None
@@ -79,24 +81,22 @@ if __name__ == '__main__':
     # Mainloop
     while run:
 
-        # Change window scale
+        # Change window scale (only the window changes size, the programs carry on drawing at the same size)
         if win_scale != local_settings.get_setting('win_scale'):
             win_scale = local_settings.get_setting('win_scale')
-            running_program.quit()
-            running_program = program(win, win_scale, user_id)
-            running_program.sub_program_name = 'settings'
-            running_program.sub_program = splash_screens.Settings(win, win_scale, user_id, running_program.icons)
-            win = create_window(win_scale)
+            create_window(win_scale)
 
         # Hand control to another program
         if buffer != program:
             buffer = program
             running_program.quit()
             pg.mixer.stop()
-            running_program = program(win, win_scale, user_id)
+            # The last program may not have cleared the window (see below)
+            win.fill((0, 0, 0))
+            running_program = program(win, window.LOGICAL_SCALE, user_id)
 
         # See if the user wants to close the application
-        events = pg.event.get()
+        events = window.get_events()
         for event in events:
             if event.type == pg.QUIT:
                 run = False
@@ -104,7 +104,7 @@ if __name__ == '__main__':
 
         # Error message
         if error_message is not None and error_box is None:
-            error_box = gui.ErrorBox(error_message, win_scale)
+            error_box = gui.ErrorBox(error_message, window.LOGICAL_SCALE)
             error_box.display(win)
 
         if error_box is None:
@@ -127,9 +127,16 @@ if __name__ == '__main__':
 
         # PyGame Essential
         clock.tick(60)
-        pg.display.update()
 
-        if error_box is None and error_message is None:
+        # Programs that keep track of what they have drawn (levels) only update the parts of the window that have
+        # changed, and rub out what they drew themselves instead of the window being cleared
+        dirty_rects = None
+        if error_box is None and error_message is None and hasattr(running_program, 'get_dirty_rects'):
+            dirty_rects = running_program.get_dirty_rects()
+
+        window.present(win, dirty_rects)
+
+        if dirty_rects is None and error_box is None and error_message is None:
             win.fill((0, 0, 0))
 
     pg.quit()
@@ -1,12 +1,15 @@
 __author__ = 'Will Evans'
 
+import assets
 import os
 import pygame as pg
 import networking
 import local_database
+import window
 
 from sprites import *
 from multiplayer_sprites import *
+from pathfinding import PathPool, PathScheduler, PATH_POOL_WORKERS
 from datastructures import Maze
 from gui import *
 
@@ -91,7 +94,7 @@ class Multiplayer:
         for avatar in self.avatars:
             avatar.display(win)
 
-        pg.display.update()
+        window.present(win)
 
     def check_inputs(self, events):
         """
@@ -113,7 +116,7 @@ class Multiplayer:
         """
 
         for choice in self.choices:
-            if choice.check_mouse(*pg.mouse.get_pos()):
+            if choice.check_mouse(*window.get_mouse_pos()):
                 choice.react()
 
     def get_program(self):
@@ -348,6 +351,8 @@ class HostMenu:
         return self.error_message
 
     def quit(self):
+        if self.level is not None:
+            self.level.quit()
         self.server.quit()
         pg.mixer.stop()
 
@@ -594,19 +599,17 @@ class ClientLevel:
 
         # Indicators
         self.score_position = (7 * 12, 2 * 12)
-        self.score_indicator = Word('{}'.format(self.score), self.score_position, (234, 234, 234), 24, win_scale)
+        self.score_indicator = NumberWord(self.score, self.score_position, (234, 234, 234), 24, win_scale)
 
         self.ready_text = Word('ready!', (17.5 * 12, 20.5 * 12), (255, 255, 30), 23, win_scale, italic=True)
         self.game_over_text = Word('game over', (18 * 12, 20.5 * 12), (255, 0, 0), 21, win_scale)
 
-        self.points_text = {}
-        for text in os.listdir('Resources\\sprites\\{}'.format('points')):
-            # noinspection PyUnresolvedReferences
-            self.points_text.update({text: pg.transform.scale(
-                pg.image.load('Resources\\sprites\\{}\\{}'.format('points', text)),
-                ((24 * win_scale), (10 * win_scale)))})
+        self.points_text = assets.get_images(os.path.join('Resources', 'sprites', 'points'),
+                                             ((24 * win_scale), (10 * win_scale)))
 
         # Sprites
+        skins = [player['skin'] for player in self.players.values() if player['skin'] is not None]
+        assets.prewarm(skins)
         self.pac_man, self.ghosts = self.get_players(self.players, self.game_maze, win_scale, self.client)
         self.ghosts_copy = self.ghosts[::]
 
@@ -614,9 +617,9 @@ class ClientLevel:
         self.pellets = []
         self.power_pellets = []
         pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'pellet.png')
-        pellet_skin = pg.transform.scale(pg.image.load(pellet_skin_path), (4 * win_scale, 4 * win_scale))
+        pellet_skin = assets.get_image(pellet_skin_path, (4 * win_scale, 4 * win_scale))
         power_pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'power_pellet.png')
-        power_pellet_skin = pg.transform.scale(pg.image.load(power_pellet_skin_path), (12 * win_scale, 12 * win_scale))
+        power_pellet_skin = assets.get_image(power_pellet_skin_path, (12 * win_scale, 12 * win_scale))
         pellet_sound_channel = pg.mixer.Channel(2)
         pellet_sound_channel.set_volume(0.5 * (local_settings.get_setting('game_volume') / 100))
 
@@ -755,7 +758,7 @@ class ClientLevel:
 
                     win.blit(self.points_text['{}.png'.format(str(points))],
                              (self.pac_man.x, self.pac_man.y - 8 * self.win_scale))
-                    pg.display.update()
+                    window.present(win)
                     sleep(1)
 
             # Update and display Pac-Man
@@ -773,7 +776,7 @@ class ClientLevel:
             if self.pac_man.death_animation_finished:
                 self.game_over_text.display(win)
                 client_id = [ghost.client_id for ghost in self.ghosts if ghost.won][0]
-                pg.display.update()
+                window.present(win)
                 sleep(2)
                 self.finished = True
                 self.winner_id = client_id
@@ -786,8 +789,7 @@ class ClientLevel:
                     ghost.update(events)
                     ghost.display(win)
 
-            self.score_indicator = Word('{}'.format(self.client.get_data(self.client.get_client_id(), 'score')),
-                                        self.score_position, (234, 234, 234), 24, self.win_scale)
+            self.score_indicator.set_number(self.client.get_data(self.client.get_client_id(), 'score'))
             self.score_indicator.display(win)
 
         return True, None
@@ -919,6 +921,17 @@ class HostLevel(ClientLevel):
         # Clock
         self.score_update_clock = 0
 
+        # Every AI ghost's searches in a frame are answered together. If PATH_POOL_WORKERS is set, searches needed on a
+        # later frame are made by worker processes, so a slow search doesn't hold up the frame for every client
+        self.path_pool = None
+        if PATH_POOL_WORKERS:
+            self.path_pool = PathPool(game_maze.tile_map, game_maze.next_hops, workers=PATH_POOL_WORKERS)
+        self.path_scheduler = PathScheduler(self.path_pool)
+        for ghost in self.ghosts:
+            ghost.set_scheduler(self.path_scheduler)
+        if isinstance(self.pac_man, ServerPacManAI):
+            self.pac_man.set_scheduler(self.path_scheduler)
+
     def get_players(self, players, game_maze, win_scale, server):
         """
         This takes the list of players and assigns each of them the appropriate multiplayer sprite based on whether they
@@ -1044,8 +1057,27 @@ class HostLevel(ClientLevel):
                 ghost.add_points(points)
         else:
             self.score_update_clock += 1 / 60
+
+        self.path_scheduler.new_frame()
+        for ghost in self.ghosts:
+            ghost.submit_path()
+        if isinstance(self.pac_man, ServerPacManAI):
+            self.pac_man.submit_path()
+
         super().run(win, events)
 
+        if self.finished:
+            self.quit()
+
+    def quit(self):
+        """
+        Stops the path finding worker processes.
+        :return: None
+        """
+
+        if self.path_pool is not None:
+            self.path_pool.shutdown()
+
 
 def get_avatar_skins():
     """
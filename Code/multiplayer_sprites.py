@@ -4,7 +4,8 @@ import sprites
 import pygame as pg
 import random
 import os
-from pathfinding import Manhattan as Search
+from pathfinding import get_search_class
+from pathfinding import ScheduledSearch, get_direction
 
 
 class ClientPacMan(sprites.PacMan):
@@ -56,7 +57,7 @@ class ClientPacMan(sprites.PacMan):
         self.x *= self.win_scale
         self.y *= self.win_scale
 
-        self.skin_rect = self.skins['{}_{}.png'.format(self.facing, self.skin)].get_rect(center=(self.x, self.y))
+        self.skin_rect = self.skins.get_rect(center=(self.x, self.y))
         self.rect = pg.Rect(self.x - int(6 * self.win_scale),
                             self.y - int(6 * self.win_scale),
                             12 * self.win_scale,
@@ -149,7 +150,7 @@ class ClientGhost(sprites.Ghost):
         self.x *= self.win_scale
         self.y *= self.win_scale
 
-        self.skin_rect = self.skins['{}_{}.png'.format(self.facing, self.skin)].get_rect(center=(self.x, self.y))
+        self.skin_rect = self.skins.get_rect(center=(self.x, self.y))
         self.rect = pg.Rect(self.x - int(6 * self.win_scale),
                             self.y - int(6 * self.win_scale),
                             12 * self.win_scale,
@@ -197,7 +198,7 @@ class ClientPlayerGhost(ClientGhost):
         :return: None
         """
 
-        win.blit(self.skins['{}_{}.png'.format(self.facing, self.skin)], self.skin_rect)
+        self.skins.blit(win, (self.facing, self.skin), self.skin_rect)
         win.blit(self.spotlight, self.spotlight.get_rect(center=self.skin_rect.center))
 
     def get_input(self, events):
@@ -375,7 +376,10 @@ class ServerPacManAI(sprites.PacMan):
         self.client_id = client_id
 
         # Search
-        self.search = Search(maze.tile_map)
+        self.search = get_search_class()(maze.tile_map, maze.next_hops, board=maze.board)
+
+        # Pellet the next path heads for, chosen when the search can be started ahead of time
+        self.next_target = None
 
         # Path finding
         self.path = self.get_path()
@@ -409,12 +413,6 @@ class ServerPacManAI(sprites.PacMan):
         :return: Next move.
         """
 
-        if self.tile.pos[1] == 17:
-            if self.tile.pos[0] <= 5 or self.tile.pos[0] >= 22:
-                if self.tile.pos[0] == 5 or self.tile.pos[0] == 22:
-                    self.next_coords = self.get_path()[1]
-                return self.facing
-
         tile_x, tile_y = self.tile.pos
         x, y = self.next_coords
 
@@ -423,6 +421,11 @@ class ServerPacManAI(sprites.PacMan):
                 self.next_coords = self.get_path()[1]
             except TypeError as e:
                 print(e)
+
+        # Paths go through the tunnels, keep going until Pac-Man comes out of the other side
+        if self.maze.wraps.get((tile_x, tile_y - 3, self.facing)) == tuple(self.next_coords):
+            return self.facing
+
         x, y = self.next_coords
         y += 3
 
@@ -458,12 +461,52 @@ class ServerPacManAI(sprites.PacMan):
         """
 
         start_tile = self.tile.pos
+        start_tile = (start_tile[0], start_tile[1] - 3)
+        target_tile = self.next_target or self.get_target()
+        self.next_target = None
+        return self.search.astar(start_tile, target_tile, self.facing)
+
+    def get_target(self):
+        """
+        Picks a random pellet tile.
+        :return: (tilex, tiley) in maze coords.
+        """
+
         chosen_row = random.choice(self.maze.tiles[1:-1])
         pellet_tiles = [tile for tile in chosen_row if tile.type == 'pellet']
         target_tile = random.choice(pellet_tiles).pos
-        start_tile = (start_tile[0], start_tile[1] - 3)
-        target_tile = (target_tile[0], target_tile[1] - 3)
-        return self.search.astar(start_tile, target_tile, self.facing)
+        return target_tile[0], target_tile[1] - 3
+
+    def set_scheduler(self, scheduler):
+        """
+        Sends Pac-Man's searches through the host's PathScheduler.
+        :param scheduler: PathScheduler object.
+        :return: None
+        """
+
+        self.search = scheduler.bind(self.search)
+
+    def submit_path(self):
+        """
+        Picks the pellet the next path heads for and starts the search for it ahead of time, so it can be made in the
+        scheduler's PathPool while Pac-Man moves to the next coords.
+        :return: None
+        """
+
+        if not isinstance(self.search, ScheduledSearch):
+            return
+
+        tile_x, tile_y = self.tile.pos
+        tile = (tile_x, tile_y - 3)
+        next_tile = tuple(self.next_coords)
+        if next_tile == tile:
+            return
+
+        facing = get_direction(tile, next_tile, self.maze.wraps)
+        if facing is not None:
+            if self.next_target is None:
+                self.next_target = self.get_target()
+            self.search.submit_ahead(next_tile, self.next_target, facing)
 
     def update_score(self, score):
         self.server.update_data(self.client_id, 'score', score)
@@ -505,7 +548,7 @@ class ServerPlayerGhost(sprites.Ghost):
         self.server.update_data(self.client_id, 'move', self.online_move)
 
     def display(self, win):
-        win.blit(self.skins['{}_{}.png'.format(self.facing, self.skin)], self.skin_rect)
+        self.skins.blit(win, (self.facing, self.skin), self.skin_rect)
         win.blit(self.spotlight, self.spotlight.get_rect(center=self.skin_rect.center))
 
     def get_move(self, events):
@@ -1,17 +1,52 @@
 __author__ = 'Will Evans'
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
 from datastructures import *
+import heapq
+import threading
 
+# NumPy is optional, without it NumpySearch falls back to the normal search
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Number of worker processes a host's PathPool uses and how long (in seconds) the host waits for a worker's answer before
+# making the search itself. The pool is off (0) by default: reading a path from a NextHopTable takes about 0.035ms, but
+# a round trip to a worker takes about 0.19ms. It only helps for mazes too large to have a table
+PATH_POOL_WORKERS = 0
+PATH_POOL_BUDGET = 0.002
+
+# Longest a PathPool keeps answers that haven't been asked for
+PATH_POOL_SIZE = 32
+
+# If True (and NumPy is installed) the ghosts use NumpySearch, which answers searches the NextHopTable can't (mazes too
+# large to have one, or while it is still being built) from NumPy distance maps instead of the JunctionGraph
+NUMPY_SEARCH = False
 
 
 class Search:
-    def __init__(self, maze):
+    def __init__(self, maze, next_hops=None, path_cache=True, board=None):
         """
         Search is an object so that we can save the maze.
         :param maze: 2D list of the maze.
+        :param next_hops: NextHopTable compiled from the maze. If given, paths are read from the table instead of
+        being searched for. Mazes too large to have a table leave it out (as does the benchmark), so every path is found
+        by searching the maze's JunctionGraph.
+        :param path_cache: If True, finished paths are kept in the PathCache shared by every search.
+        :param board: The maze's WalkableBoard (Maze.board). Built from the maze if not given.
         """
 
         self.maze = maze
+        self.next_hops = next_hops
+        self.tunnels = Tunnels(maze, board)
+        self.path_cache = shared_path_cache if path_cache else None
+        self.cache_key = self.get_cache_key()
+
+        # Number of nodes taken off the open queue by route and tile_astar (used by the benchmark)
+        self.expanded = 0
 
     def astar(self, start, end, facing):
         """
@@ -22,11 +57,232 @@ class Search:
         :return: Path in (x, y) format.
         """
 
+        if self.path_cache is None:
+            return self.find_path(start, end, facing)
+
+        # Ghosts keep asking for the same paths (e.g. to their home tiles or the ghost house)
+        key = (self.cache_key, start, end, facing)
+        found, path = self.path_cache.get(key)
+        if not found:
+            path = self.path_cache.add(key, self.find_path(start, end, facing))
+        return path
+
+    def astar_many(self, queries):
+        """
+        Answers many searches together (e.g. every ghost's search in a frame). Repeated queries are only searched once
+        and queries that have to be searched for share the work for an end tile they have in common.
+        :param queries: List of (start, end, facing).
+        :return: List of paths in (x, y) format (None where the end can't be reached), in the same order as queries.
+        """
+
+        paths = {}
+        missing = []
+        for query in OrderedDict.fromkeys(queries):
+            if self.path_cache is not None:
+                found, path = self.path_cache.get((self.cache_key, *query))
+                if found:
+                    paths[query] = path
+                    continue
+            missing.append(query)
+
+        for query, path in zip(missing, self.find_paths(missing)):
+            if self.path_cache is not None:
+                path = self.path_cache.add((self.cache_key, *query), path)
+            paths[query] = path
+
+        return [paths[query] for query in queries]
+
+    def find_paths(self, queries):
+        """
+        Finds the paths for a list of queries, without using the PathCache. Queries are grouped by end tile, and when
+        more than one query for an end can't be read from the NextHopTable, a single reverse search from the end
+        (get_field) answers all of them instead of a search from every start.
+        :param queries: List of (start, end, facing), with no repeats.
+        :return: List of paths in (x, y) format, in the same order as queries.
+        """
+
+        paths = {}
+        for end, group in group_by_end(queries).items():
+            searched = [query for query in group if self.next_hops is None or not self.next_hops.has(query[0])]
+            field = self.get_field(end) if len(searched) > 1 else None
+            for query in group:
+                if field is not None and query in searched:
+                    paths[query] = self.follow_field(field, *query)
+                else:
+                    paths[query] = self.find_path(*query)
+
+        return [paths[query] for query in queries]
+
+    def get_batch_key(self):
+        """
+        Searches with the same key always find the same paths, so a PathScheduler can answer them in one batch.
+        :return: Hashable key.
+        """
+
+        return type(self), id(self.maze), self.next_hops is not None
+
+    def get_cache_key(self):
+        """
+        Searches with the same key always find the same paths, whichever Search object made them. Mazes are keyed by
+        their contents, so every sprite in a maze shares its paths.
+        :return: Hashable key.
+        """
+
+        return type(self), get_maze_hash(self.maze), self.next_hops is not None
+
+    def find_path(self, start, end, facing):
+        """
+        Finds a path without using the PathCache.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format.
+        """
+
+        if self.next_hops is not None and self.next_hops.has(start):
+            return self.next_hops.get_path(start, end, facing)
+        return self.junction_astar(start, end, facing)
+
+    def get_junction_graph(self):
+        """
+        Builds the JunctionGraph of the maze the first time it is needed, so that searches of mazes with a NextHopTable
+        don't build a graph they never use. The graph is kept on the WalkableBoard, so searches sharing a board share it.
+        :return: JunctionGraph object.
+        """
+
+        board = self.tunnels.board
+        if board.junction_graph is None:
+            board.junction_graph = JunctionGraph(self.maze, self.tunnels)
+        return board.junction_graph
+
+    def junction_astar(self, start, end, facing):
+        """
+        Searches the maze's JunctionGraph and expands the route into a path.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        route = self.route(start, end, facing)
+        if route is None:
+            return None
+        return self.get_junction_graph().expand(route)
+
+    def route(self, start, end, facing):
+        """
+        Searches the JunctionGraph of the maze, so only tiles where a sprite can choose which way to go are expanded.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Route in (x, y, facing) format (the start, then every junction passed, then the end), or None if the
+        end can't be reached. JunctionGraph.expand turns it into a path.
+        """
+
+        junction_graph = self.get_junction_graph()
         open_queue = PriorityQueue()
-        closed_set = []
+        closed_set = ClosedSet()
         start_node = Node(*start, facing)
         start_node.h_score = self.heuristic(start_node, end)
-        start_node.g_score = start_node.h_score + start_node.f_score
+        start_node.f_score = start_node.g_score + start_node.h_score
+        open_queue.en_queue(start_node)
+
+        while not open_queue.is_empty():
+
+            # Getting the next node (closest to the goal) to evaluate. The start is left open so that a path from a
+            # tile back to itself can finish on it
+            current_node = open_queue.pop()
+            self.expanded += 1
+            if current_node is not start_node:
+                if (current_node.x, current_node.y) == end:
+                    return current_node.get_route([])
+                closed_set.add(current_node)
+
+            # Getting the junctions (or the end) at the other end of each corridor leaving this node
+            for x, y, move, cost in junction_graph.get_legs(current_node, end):
+                child = Node(x, y, move, current_node)
+                if not closed_set.has(child):
+                    self.evaluate(child, end, cost)
+                    open_queue.en_queue(child)
+
+    def get_field(self, end):
+        """
+        Runs a reverse search from the end tile (Dijkstra's, as tunnel tiles cost more than one move), the same way
+        NextHopTable is built but for a single target.
+        :param end: End tile (tilex, tiley).
+        :return: Dictionary of (x, y, facing): next move towards the end.
+        """
+
+        field = {}
+        if not self.tunnels.board.has(*end):
+            return field
+
+        # Every state on the end tile has arrived
+        distances = {(*end, facing): 0 for facing in FACINGS}
+        queue = [(0, state) for state in distances]
+
+        while queue:
+            distance, (x, y, move) = heapq.heappop(queue)
+            if distance > distances[(x, y, move)]:
+                continue
+            self.expanded += 1
+
+            # Wraps go both ways, so the tile behind is the one a move the opposite way leads to
+            previous = self.tunnels.get_neighbour(x, y, OPPOSITES[move])
+            if previous is None:
+                continue
+            distance += self.tunnels.get_cost(x, y)
+
+            # Any state behind this one can move into it, unless the move would turn it around
+            for facing in FACINGS:
+                if facing == OPPOSITES[move]:
+                    continue
+                state = (*previous, facing)
+                if distance < distances.get(state, distance + 1):
+                    distances[state] = distance
+                    field[state] = move
+                    heapq.heappush(queue, (distance, state))
+                elif state not in field:
+                    field[state] = move
+
+        return field
+
+    def follow_field(self, field, start, end, facing):
+        """
+        Follows the moves from get_field from start to end.
+        :param field: Output of get_field for the end tile.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        path = [start]
+        x, y = start
+        while True:
+            move = field.get((x, y, facing))
+            if move is None:
+                return None
+            x, y = self.tunnels.get_neighbour(x, y, move)
+            facing = move
+            path.append((x, y))
+            if (x, y) == end:
+                return path
+
+    def tile_astar(self, start, end, facing):
+        """
+        Searches the maze one tile at a time.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format.
+        """
+
+        open_queue = PriorityQueue()
+        closed_set = ClosedSet()
+        start_node = Node(*start, facing)
+        start_node.h_score = self.heuristic(start_node, end)
+        start_node.f_score = start_node.g_score + start_node.h_score
         open_queue.en_queue(start_node)
         flag = False
 
@@ -34,7 +290,8 @@ class Search:
 
             # Getting the next node (closest to the goal) to evaluate
             current_node = open_queue.pop()
-            closed_set.append(current_node)
+            self.expanded += 1
+            closed_set.add(current_node)
 
             # Checking whether the goal has been reached
             if (current_node.x, current_node.y) == end and flag:
@@ -43,27 +300,28 @@ class Search:
             flag = True
 
             # Getting adjacent nodes
-            children = get_children(current_node, self.maze)
+            children = get_children(current_node, self.tunnels.board)
 
-            # Adding newly evaluated nodes to the open_queue if not already evaluated
+            # Adding newly evaluated nodes to the open_queue if not already evaluated. If the child is already in the
+            # open_queue it only replaces the queued node when it has found a shorter route to it
             for child in children:
-                self.evaluate(child, end)
-                if not open_queue.has(child):
-                    if not in_closed(child, closed_set):
-                        open_queue.en_queue(child)
+                if not closed_set.has(child):
+                    self.evaluate(child, end, self.tunnels.get_cost(child.x, child.y))
+                    open_queue.en_queue(child)
 
-    def evaluate(self, child, end):
+    def evaluate(self, child, end, cost=1):
         """
         Assigns each child an h score and a g score, then combines these for the f score. These determine the fitness of
         the child, by considering how many nodes there have been before the child and how close the child is to
         the end node. This score is then used to choose the next child to expand.
         :param child: Node object.
         :param end: End tile (tilex, tiley)
+        :param cost: Cost of the moves between the parent and the child (tunnel tiles cost more than one move).
         :return: None
         """
 
         child.h_score = self.heuristic(child, end)
-        child.g_score = child.parent.g_score + 1
+        child.g_score = child.parent.g_score + cost
         child.f_score = child.g_score + child.h_score
 
     def heuristic(self, node, end):
@@ -72,8 +330,8 @@ class Search:
 
 class Dijkstra(Search):
     # Checks all paths
-    def __init__(self, maze):
-        super().__init__(maze)
+    def __init__(self, maze, next_hops=None, path_cache=True, board=None):
+        super().__init__(maze, next_hops, path_cache, board)
 
     # noinspection PyMethodMayBeStatic
     def heuristic(self, node, end):
@@ -90,59 +348,981 @@ class Dijkstra(Search):
 
 class Manhattan(Search):
     # Uses Manhattan distance as heuristic (most efficient)
-    def __init__(self, maze):
-        super().__init__(maze)
+    def __init__(self, maze, next_hops=None, path_cache=True, board=None):
+        super().__init__(maze, next_hops, path_cache, board)
 
     # noinspection PyMethodMayBeStatic
     def heuristic(self, node, end):
-        x, y = end
-        return abs(node.x - x) + abs(node.y - y)
+        x, y = self.tunnels.get_offset(node.x, node.y, end)
+        return x + y
 
 
 class Euclidean(Search):
     # Not as efficient as Manhattan as cost of diagonal is the same as east and the north move in Pac-Man
-    def __init__(self, maze):
-        super().__init__(maze)
+    def __init__(self, maze, next_hops=None, path_cache=True, board=None):
+        super().__init__(maze, next_hops, path_cache, board)
 
     # noinspection PyMethodMayBeStatic
     def heuristic(self, node, end):
-        x, y = end
-        return ((node.x - x)**2 + (node.y - y)**2)**0.5
+        x, y = self.tunnels.get_offset(node.x, node.y, end)
+        return (x**2 + y**2)**0.5
+
+
+class NumpySearch(Manhattan):
+    def __init__(self, maze, next_hops=None, path_cache=True, board=None):
+        """
+        Search that reads paths from whole maze distance maps, made with NumPy array operations instead of Nodes. The
+        NextHopTable is still used for every start it has. Falls back to the normal search if NumPy isn't installed.
+        :param maze: 2D list of the maze.
+        :param next_hops: NextHopTable compiled from the maze (optional).
+        :param path_cache: If True, finished paths are kept in the PathCache shared by every search.
+        :param board: The maze's WalkableBoard (optional).
+        """
+
+        super().__init__(maze, next_hops, path_cache, board)
+        self.distance_maps = DistanceMaps(maze, self.tunnels) if np is not None else None
+
+    def find_path(self, start, end, facing):
+        """
+        Follows the distance map of the end tile, the same way as Search.find_path.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        if self.distance_maps is None or (self.next_hops is not None and self.next_hops.has(start)):
+            return super().find_path(start, end, facing)
+        return self.distance_maps.get_path(start, end, facing)
+
+    def find_paths(self, queries):
+        """
+        Same as Search.find_paths, but the maps for every end are made together in one wavefront.
+        :param queries: List of (start, end, facing), with no repeats.
+        :return: List of paths in (x, y) format, in the same order as queries.
+        """
+
+        if self.distance_maps is None:
+            return super().find_paths(queries)
+
+        mapped = [query for query in queries if self.next_hops is None or not self.next_hops.has(query[0])]
+        paths = dict(zip(mapped, self.distance_maps.get_paths(mapped)))
+        others = [query for query in queries if query not in paths]
+        paths.update(zip(others, super().find_paths(others)))
+        return [paths[query] for query in queries]
+
+    def map_astar(self, start, end, facing):
+        """
+        Always follows the distance maps, even if the NextHopTable has the start (used by the benchmark).
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        if self.distance_maps is None:
+            return self.junction_astar(start, end, facing)
+        return self.distance_maps.get_path(start, end, facing)
+
+    def get_distances(self, start, facing, ends):
+        """
+        Evaluates many targets at once (e.g. to choose between ghost targets), making all their maps together.
+        :param start: Start tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :param ends: List of end tiles (tilex, tiley).
+        :return: List of path lengths (in moves, with tunnel tiles costing TUNNEL_COST), None for ends that can't be
+        reached.
+        """
+
+        if self.distance_maps is None:
+            paths = [self.junction_astar(start, end, facing) for end in ends]
+            return [None if path is None else sum(self.tunnels.get_cost(x, y) for x, y in path[1:]) for path in paths]
+        return self.distance_maps.get_distances(start, facing, ends)
+
+
+class DistanceMaps:
+    def __init__(self, maze, tunnels, size=16):
+        """
+        Number of moves needed to reach a target from every (facing, tile) in the maze, stored as NumPy arrays of shape
+        (4, height, width). Maps are made with a wavefront: each step every state takes the best of the states it can
+        move into (not turning around, going through the wrap around tunnels and paying for tunnel tiles), for every
+        target at once.
+        :param maze: 2D list of the maze.
+        :param tunnels: Tunnels of the maze.
+        :param size: How many maps to keep.
+        """
+
+        self.maze = maze
+        self.tunnels = tunnels
+        self.size = size
+        self.maps = OrderedDict()
+        self.height = len(maze)
+        self.width = max(len(row) for row in maze)
+
+        # Walls (and tiles outside of short rows) are False
+        self.walkable = np.zeros((self.height, self.width), dtype=bool)
+        for y, row in enumerate(maze):
+            self.walkable[y, :len(row)] = [tile != 1 for tile in row]
+        self.unreachable = np.iinfo(np.int32).max // 2
+
+        # Rows and columns that wrap around. The padding at each end is copied from the other end, so a move off the
+        # edge reads the tile on the other side (only full width rows / full height columns can be padded this way)
+        self.wrap_rows = [y for x, y, move in tunnels.wraps if move == 'w' and len(maze[y]) == self.width]
+        self.wrap_columns = [x for x, y, move in tunnels.wraps if move == 'n']
+
+        # Cost of moving onto each tile, padded the same way as the maps
+        self.costs = np.ones((self.height + 2, self.width + 2), dtype=np.int32)
+        for x, y in tunnels.tiles:
+            self.costs[y + 1, x + 1] = TUNNEL_COST
+        self.wrap_padding(self.costs)
+
+    def wrap_padding(self, array):
+        """
+        Copies the ends of the wrap around rows and columns into the padding on the other side.
+        :param array: Padded array, the last two axes are (height + 2, width + 2).
+        :return: None
+        """
+
+        for y in self.wrap_rows:
+            array[..., y + 1, 0] = array[..., y + 1, self.width]
+            array[..., y + 1, self.width + 1] = array[..., y + 1, 1]
+        for x in self.wrap_columns:
+            array[..., 0, x + 1] = array[..., self.height, x + 1]
+            array[..., self.height + 1, x + 1] = array[..., 1, x + 1]
+
+    def make_maps(self, ends):
+        """
+        Makes the distance maps for a list of end tiles.
+        :param ends: List of end tiles (tilex, tiley).
+        :return: Array of shape (len(ends), 4, height, width).
+        """
+
+        distances = np.full((len(ends), 4, self.height + 2, self.width + 2), self.unreachable, dtype=np.int32)
+        inside = distances[:, :, 1:-1, 1:-1]
+        arrived = np.zeros((len(ends), 1, self.height, self.width), dtype=bool)
+        for num, (x, y) in enumerate(ends):
+            if 0 <= y < self.height and 0 <= x < self.width and self.walkable[y, x]:
+                arrived[num, 0, y, x] = True
+        inside[np.broadcast_to(arrived, inside.shape)] = 0
+
+        while True:
+            # Distance from each tile if the next move is in each direction (padding makes the edges unreachable,
+            # apart from the wrap around tunnels)
+            self.wrap_padding(distances)
+            moves = [distances[:, num, 1 + dy:1 + dy + self.height, 1 + dx:1 + dx + self.width] +
+                     self.costs[1 + dy:1 + dy + self.height, 1 + dx:1 + dx + self.width]
+                     for num, (dx, dy) in enumerate(VECTORS[move] for move in FACINGS)]
+
+            # Sprites can't turn around, so a sprite facing each way can only take three of the moves
+            best = np.stack([np.minimum.reduce([moves[num] for num, move in enumerate(FACINGS)
+                                                if move != OPPOSITES[facing]]) for facing in FACINGS], axis=1)
+            best[:, :, ~self.walkable] = self.unreachable
+            best[np.broadcast_to(arrived, best.shape)] = 0
+            best = np.minimum(best, self.unreachable)
+
+            if np.array_equal(best, inside):
+                return inside.copy()
+            inside[...] = best
+
+    def get_maps(self, ends):
+        """
+        Returns the maps for a list of end tiles, only making the ones that aren't already stored.
+        :param ends: List of end tiles (tilex, tiley).
+        :return: List of arrays of shape (4, height, width).
+        """
+
+        missing = list(OrderedDict.fromkeys(end for end in ends if end not in self.maps))
+        if missing:
+            for end, distance_map in zip(missing, self.make_maps(missing)):
+                self.maps[end] = distance_map
+
+        maps = []
+        for end in ends:
+            self.maps.move_to_end(end)
+            maps.append(self.maps[end])
+        while len(self.maps) > max(self.size, len(set(ends))):
+            self.maps.popitem(last=False)
+        return maps
+
+    def get_move(self, distance_map, x, y, facing):
+        """
+        Chooses the move that reaches the end in the fewest moves.
+        :param distance_map: Array of shape (4, height, width).
+        :param x: Tile x.
+        :param y: Tile y.
+        :param facing: Direction sprite is currently facing.
+        :return: (move, distance) or (None, None) if the end can't be reached.
+        """
+
+        best_move, best_distance = None, self.unreachable
+        for num, move in enumerate(FACINGS):
+            tile = self.tunnels.get_neighbour(x, y, move)
+            if move == OPPOSITES[facing] or tile is None:
+                continue
+            next_x, next_y = tile
+            distance = int(distance_map[num, next_y, next_x]) + self.tunnels.get_cost(next_x, next_y)
+            if distance < best_distance:
+                best_move, best_distance = move, distance
+
+        if best_move is None:
+            return None, None
+        return best_move, best_distance
+
+    def get_path(self, start, end, facing):
+        """
+        Follows the map from start to end.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        return self.follow(self.get_maps([end])[0], start, end, facing)
+
+    def get_paths(self, queries):
+        """
+        Follows the maps for many queries, making the maps of every end together.
+        :param queries: List of (start, end, facing).
+        :return: List of paths in (x, y) format, in the same order as queries.
+        """
+
+        if not queries:
+            return []
+        distance_maps = self.get_maps([end for _, end, _ in queries])
+        return [self.follow(distance_map, start, end, facing)
+                for distance_map, (start, end, facing) in zip(distance_maps, queries)]
+
+    def follow(self, distance_map, start, end, facing):
+        """
+        Follows a map from start to end.
+        :param distance_map: Array of shape (4, height, width), made for the end tile.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format, or None if the end can't be reached.
+        """
+
+        path = [start]
+        x, y = start
+        while True:
+            move, _ = self.get_move(distance_map, x, y, facing)
+            if move is None:
+                return None
+            x, y = self.tunnels.get_neighbour(x, y, move)
+            facing = move
+            path.append((x, y))
+            if (x, y) == end:
+                return path
+
+    def get_distances(self, start, facing, ends):
+        """
+        Reads how many moves it takes to reach each end tile.
+        :param start: Start tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :param ends: List of end tiles (tilex, tiley).
+        :return: List of path lengths, None for ends that can't be reached.
+        """
+
+        return [self.get_move(distance_map, *start, facing)[1] for distance_map in self.get_maps(ends)]
+
+
+class IncrementalSearch:
+    def __init__(self, search, limit=8):
+        """
+        Keeps the last path between calls and repairs it instead of searching again, for targets that move one tile at
+        a time (e.g. a ghost chasing Pac-Man). Moving along the path drops the tiles behind, and when the end moves
+        onto a neighbouring tile the path is cut short (if the new end is already on it) or extended by one move. A
+        full search is only made when the path can't be repaired, or after a number of repairs in a row so that the
+        path can't drift too far from the shortest one. Paths read from the NextHopTable are already the shortest and
+        cost a few table reads, so they are never repaired.
+        :param search: Search object used for full searches.
+        :param limit: Number of repairs allowed in a row.
+        """
+
+        self.search = search
+        self.next_hops = search.next_hops
+        self.tunnels = search.tunnels
+        self.limit = limit
+        self.path = None
+        self.facings = None
+        self.repairs = 0
+        self.replans = 0
+        self.repaired = 0
+
+    def astar(self, start, end, facing):
+        """
+        Same as Search.astar, but repairs the last path when it can.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format.
+        """
+
+        if self.next_hops is not None and self.next_hops.has(start):
+            self.set_path(None, facing)
+            self.repaired = 0
+            return self.search.astar(start, end, facing)
+
+        if self.repaired < self.limit and self.repair(start, end, facing):
+            self.repairs += 1
+            self.repaired += 1
+            return self.path
+
+        self.replans += 1
+        self.repaired = 0
+        path = self.search.astar(start, end, facing)
+        self.set_path(path, facing)
+        return path
+
+    def set_path(self, path, facing):
+        """
+        Saves a path, along with the facing of the sprite on each tile.
+        :param path: Path in (x, y) format.
+        :param facing: Direction sprite is facing at the start of the path.
+        :return: None
+        """
+
+        if path is None:
+            self.path = self.facings = None
+            return
+
+        self.path = tuple(path)
+        self.facings = [facing]
+        for (x, y), (next_x, next_y) in zip(path, path[1:]):
+            self.facings.append(get_direction((x, y), (next_x, next_y), self.tunnels.wraps))
+
+    def repair(self, start, end, facing):
+        """
+        Tries to change the last path into a path from start to end.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: True if the path was repaired.
+        """
+
+        if self.path is None:
+            return False
+
+        # The sprite must still be on the path, facing the way the path goes
+        for num, tile in enumerate(self.path[:-1]):
+            if tile == start and self.facings[num] == facing:
+                break
+        else:
+            return False
+        path, facings = list(self.path[num:]), self.facings[num:]
+
+        if path[-1] != end:
+            if end in path[1:]:
+                num = path.index(end, 1)
+                path, facings = path[:num + 1], facings[:num + 1]
+            else:
+                move = get_direction(path[-1], end, self.tunnels.wraps)
+                if move is None or move == OPPOSITES[facings[-1]] or not self.tunnels.board.has(*end):
+                    return False
+                path.append(end)
+                facings.append(move)
+
+        self.path, self.facings = tuple(path), facings
+        return True
+
+
+class PathCache:
+    def __init__(self, size=256):
+        """
+        Most recently used finished paths, keyed by (Search.get_cache_key(), start, end, facing). The search key keeps
+        the paths of different mazes and search types apart, so searches of different mazes can share the cache
+        without emptying it. Paths are stored as tuples so that sprites sharing the cache can't change each other's
+        paths. A lock is used so that it is safe to share between threads.
+        :param size: How many paths to keep.
+        """
+
+        self.size = size
+        self.paths = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Looks up a path.
+        :param key: (search key, start, end, facing).
+        :return: (found, path). Path is None if found is False or the end can't be reached.
+        """
 
+        with self.lock:
+            if key in self.paths:
+                self.paths.move_to_end(key)
+                self.hits += 1
+                return True, self.paths[key]
 
-def get_children(node, maze):
+            self.misses += 1
+            return False, None
+
+    def add(self, key, path):
+        """
+        Stores a path.
+        :param key: (search key, start, end, facing).
+        :param path: Path in (x, y) format, or None if the end can't be reached.
+        :return: The stored path (tuple).
+        """
+
+        if path is not None:
+            path = tuple(path)
+
+        with self.lock:
+            self.paths[key] = path
+            if len(self.paths) > self.size:
+                self.paths.popitem(last=False)
+
+        return path
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        :return: None
+        """
+
+        with self.lock:
+            self.paths.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_hit_rate(self):
+        """
+        :return: Fraction of look ups that found a path (0 if there haven't been any).
+        """
+
+        with self.lock:
+            total = self.hits + self.misses
+            return self.hits / total if total else 0
+
+
+# PathCache shared by every Search (the Ghosts and ServerPacManAI)
+shared_path_cache = PathCache()
+
+
+class PathScheduler:
+    def __init__(self, pool=None):
+        """
+        Collects the searches made in a frame so that they are answered together by Search.astar_many, instead of one
+        at a time whenever each ghost happens to need a path. Searches can be submitted ahead of time (e.g. by every
+        ghost at the start of a frame). The first time one of them is needed, every submitted search that can be
+        batched with it is answered. Answers are kept until the next frame, so a search is only made once a frame.
+        :param pool: PathPool that searches needed on a later frame are sent to (optional).
+        """
+
+        self.pool = pool
+        self.pending = OrderedDict()
+        self.answers = {}
+        self.batches = 0
+        self.answered = 0
+
+    def new_frame(self):
+        """
+        Forgets the last frame's searches. Run once a frame, before any sprites are updated.
+        :return: None
+        """
+
+        self.pending.clear()
+        self.answers.clear()
+
+    def bind(self, search):
+        """
+        Wraps a search so that its astar calls go through the scheduler.
+        :param search: Search object (or a ScheduledSearch, which is re-bound).
+        :return: ScheduledSearch object.
+        """
+
+        if isinstance(search, ScheduledSearch):
+            search = search.search
+        return ScheduledSearch(search, self)
+
+    def submit(self, search, start, end, facing):
+        """
+        Adds a search to the next batch without waiting for the answer.
+        :param search: Search object.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: None
+        """
+
+        key = (search.get_batch_key(), (start, end, facing))
+        if key not in self.answers:
+            self.pending[key] = search
+
+    def astar(self, search, start, end, facing):
+        """
+        Returns the answer to a search, answering it (along with every pending search it can be batched with) if it
+        hasn't been answered this frame.
+        :param search: Search object.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format.
+        """
+
+        key = (search.get_batch_key(), (start, end, facing))
+        if key not in self.answers and self.uses_pool(search):
+            found, path = self.pool.get((start, end, facing))
+            if found:
+                self.answers[key] = path
+        if key not in self.answers:
+            self.pending[key] = search
+            self.flush(key[0])
+        return self.answers[key]
+
+    def submit_ahead(self, search, start, end, facing):
+        """
+        Starts a search that won't be needed until a later frame (e.g. the one a ghost will make when it reaches its
+        next coords) in the PathPool, so it can be answered without holding up the frame. Without a pool the search is
+        made when it is needed instead.
+        :param search: Search object.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite will be facing at the start tile.
+        :return: None
+        """
+
+        if self.uses_pool(search):
+            self.pool.submit((start, end, facing))
+
+    def uses_pool(self, search):
+        """
+        Checks whether the PathPool's workers make the same searches as a search, so their answers can be used for it.
+        :param search: Search object.
+        :return: Boolean.
+        """
+
+        return self.pool is not None and search.get_batch_key() == self.pool.batch_key
+
+    def flush(self, batch_key):
+        """
+        Answers every pending search with the same batch key in one Search.astar_many call.
+        :param batch_key: Key from Search.get_batch_key.
+        :return: None
+        """
+
+        keys = [key for key in self.pending if key[0] == batch_key]
+        if not keys:
+            return
+
+        search = self.pending[keys[0]]
+        for key, path in zip(keys, search.astar_many([query for _, query in keys])):
+            self.answers[key] = path
+            del self.pending[key]
+
+        self.batches += 1
+        self.answered += len(keys)
+
+
+class ScheduledSearch:
+    def __init__(self, search, scheduler):
+        """
+        Stands in for a Search, sending its astar calls through a PathScheduler.
+        :param search: Search object.
+        :param scheduler: PathScheduler object.
+        """
+
+        self.search = search
+        self.scheduler = scheduler
+        self.maze = search.maze
+
+    def astar(self, start, end, facing):
+        """
+        Same as Search.astar, but answered in a batch by the scheduler.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: Path in (x, y) format.
+        """
+
+        return self.scheduler.astar(self.search, start, end, facing)
+
+    def submit(self, start, end, facing):
+        """
+        Submits a search that is expected to be made later this frame.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite is currently facing.
+        :return: None
+        """
+
+        self.scheduler.submit(self.search, start, end, facing)
+
+    def submit_ahead(self, start, end, facing):
+        """
+        Submits a search that is expected to be made on a later frame.
+        :param start: Start tile (tilex, tiley).
+        :param end: End tile (tilex, tiley).
+        :param facing: Direction sprite will be facing at the start tile.
+        :return: None
+        """
+
+        self.scheduler.submit_ahead(self.search, start, end, facing)
+
+
+class PathPool:
+    def __init__(self, maze, next_hops=None, search_class=None, workers=1, budget=PATH_POOL_BUDGET):
+        """
+        Makes searches in worker processes, so that a slow search doesn't hold up the host's frame (and every client
+        waiting on it). Searches are submitted with where the sprite will be when it needs the path, and collected on
+        a later frame. If a worker hasn't answered within the latency budget (or the workers can't be used) the search
+        is made in the host process instead.
+        :param maze: 2D list of the maze.
+        :param next_hops: NextHopTable compiled from the maze (optional).
+        :param search_class: Search class the workers use (defaults to get_search_class, like the ghosts).
+        :param workers: Number of worker processes.
+        :param budget: Longest time (in seconds) to wait for an answer.
+        """
+
+        self.maze = maze
+        self.search_class = search_class or get_search_class()
+        self.budget = budget
+        self.futures = OrderedDict()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=start_pool_worker,
+                                            initargs=(self.search_class, maze, next_hops))
+
+        # Search.get_batch_key of the workers' searches, only searches with the same key are answered by the pool
+        self.batch_key = (self.search_class, id(maze), next_hops is not None)
+
+        # Number of searches answered by the workers, and the number that had to be made in the host process
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, query):
+        """
+        Sends a search to the workers, if it hasn't already been sent.
+        :param query: (start, end, facing).
+        :return: None
+        """
+
+        if self.executor is None or query in self.futures:
+            return
+
+        try:
+            self.futures[query] = self.executor.submit(pool_astar, query)
+        except Exception as e:
+            # The workers couldn't be started (or have stopped), every search is made in the host process from now on
+            print(f'{e} starting the path finding workers')
+            self.shutdown()
+            return
+
+        # Searches that were never asked for (e.g. the ghost changed mode) are dropped
+        while len(self.futures) > PATH_POOL_SIZE:
+            self.futures.popitem(last=False)[1].cancel()
+
+    def get(self, query):
+        """
+        Collects the answer to a search, waiting for it for no longer than the latency budget.
+        :param query: (start, end, facing).
+        :return: (True, path) if a worker answered in time, otherwise (False, None).
+        """
+
+        future = self.futures.pop(query, None)
+        if future is None:
+            return False, None
+
+        try:
+            path = future.result(timeout=self.budget)
+        except TimeoutError:
+            future.cancel()
+            self.misses += 1
+            return False, None
+        except Exception as e:
+            print(f'{e} in a path finding worker')
+            self.misses += 1
+            return False, None
+
+        self.hits += 1
+        return True, path
+
+    def shutdown(self):
+        """
+        Stops the worker processes without waiting for their searches to finish.
+        :return: None
+        """
+
+        if self.executor is not None:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+# Search made by start_pool_worker in each of a PathPool's worker processes
+pool_search = None
+
+
+def get_search_class():
     """
-    Returns next available tiles from current tile. This can then be added to the list of children.
-    :param node: Current tile.
-    :param maze: 2D list of maze.
-    :return: List of children of current tile.
+    :return: Search class the ghosts use, NumpySearch if NUMPY_SEARCH is on and NumPy is installed, otherwise
+    Manhattan.
     """
 
-    vectors = {'s': (0, 1), 'e': (1, 0), 'w': (-1, 0), 'n': (0, -1)}
-    children = []
-    possible_moves = ['n', 'e', 's', 'w', 'n', 'e']
-    del vectors[possible_moves[possible_moves.index(node.facing) + 2]]
-    for key, value in vectors.items():
-        x, y = value
-        try:
-            # Checking surrounding tiles for walls
-            if maze[node.y + y][node.x + x] != 1:
-                children.append(Node(node.x + x, node.y + y, key, node))
-        except IndexError:
-            continue
+    if NUMPY_SEARCH and np is not None:
+        return NumpySearch
+    return Manhattan
+
+
+def start_pool_worker(search_class, maze, next_hops):
+    """
+    Run once in each PathPool worker process, so that the maze's tables are only built once per worker.
+    :param search_class: Search class to use.
+    :param maze: 2D list of the maze.
+    :param next_hops: NextHopTable compiled from the maze (or None).
+    :return: None
+    """
+
+    global pool_search
+    pool_search = search_class(maze, next_hops)
+
+
+def pool_astar(query):
+    """
+    Makes a search in a PathPool worker process.
+    :param query: (start, end, facing).
+    :return: Path in (x, y) format.
+    """
+
+    return pool_search.astar(*query)
+
+
+class Tunnels:
+    def __init__(self, maze, board=None):
+        """
+        The wrap around tunnels of a maze (worked out from the maze itself) and the tiles sprites slow down on, so that
+        searches can go through the tunnels and know what they cost. Also holds the maze's WalkableBoard, which tile by
+        tile searches get their children from.
+        :param maze: 2D list of the maze.
+        :param board: The maze's WalkableBoard, which already has the tunnels (built from the maze if not given).
+        """
+
+        self.maze = maze
+        self.board = board if board is not None else WalkableBoard(maze, get_wraps(maze))
+        self.wraps = self.board.wraps
+        self.tiles = self.board.tunnels
+
+        # Going through a tunnel is never shorter than going around the maze the other way, which keeps the heuristics
+        # from overestimating
+        self.width = min((len(maze[y]) for x, y, move in self.wraps if move == 'w'), default=None)
+        self.height = len(maze) if any(move == 'n' for x, y, move in self.wraps) else None
+
+    def get_neighbour(self, x, y, move):
+        """
+        Returns the tile a move leads to.
+        :param x: Tile x.
+        :param y: Tile y.
+        :param move: Move ('n', 'e', 's', 'w').
+        :return: (x, y) of the next tile, or None if it is a wall or outside the maze.
+        """
+
+        return get_neighbour(self.maze, self.wraps, x, y, move)
+
+    def get_cost(self, x, y):
+        """
+        :param x: Tile x.
+        :param y: Tile y.
+        :return: Cost of moving onto the tile.
+        """
+
+        return TUNNEL_COST if (x, y) in self.tiles else 1
+
+    def get_offset(self, x, y, end):
+        """
+        Works out how far a tile is from the end in each direction, allowing for the wrap around tunnels.
+        :param x: Tile x.
+        :param y: Tile y.
+        :param end: End tile (tilex, tiley).
+        :return: (x distance, y distance).
+        """
+
+        dx, dy = abs(end[0] - x), abs(end[1] - y)
+        if self.width is not None:
+            dx = min(dx, self.width - dx)
+        if self.height is not None:
+            dy = min(dy, self.height - dy)
+        return dx, dy
+
+
+class JunctionGraph:
+    def __init__(self, maze, tunnels):
+        """
+        Graph of the maze where the nodes are junctions (tiles that don't have exactly two exits) and the edges are the
+        corridors between them (including corridors through the wrap around tunnels). A sprite in a corridor can only keep
+        going forward, so searches only need to make decisions at junctions.
+        :param maze: 2D list of the maze.
+        :param tunnels: Tunnels of the maze (the exits of every tile come from its WalkableBoard).
+        """
 
-    return children
+        self.maze = maze
+        self.tunnels = tunnels
+        self.exits = {(x, y): tunnels.board.get_exits(x, y) for x, y in tunnels.board.get_tiles()}
+        self.junctions = tunnels.board.get_junctions()
+        self.edges = {}
+        self.corridors = {}
+        self.limit = len(self.exits)
 
+        # Following every corridor out of every junction
+        for x, y in self.junctions:
+            for move in self.get_exits(x, y):
+                tiles = self.follow(x, y, move)
+                if tiles is None:
+                    continue
+                for num, (tile_x, tile_y, facing) in enumerate(tiles[:-1], 1):
+                    cost = self.get_cost(tiles[:num])
+                    self.corridors.setdefault((tile_x, tile_y), []).append((x, y, move, cost, facing))
+                self.edges[(x, y, move)] = (*tiles[-1], self.get_cost(tiles))
 
-def in_closed(child, closed):
+    def has(self, tile):
+        """
+        Checks whether a tile is in the graph.
+        :param tile: (tilex, tiley).
+        :return: True if the tile isn't a wall.
+        """
+
+        return tile in self.exits
+
+    def get_exits(self, x, y):
+        """
+        Returns the directions that can be moved in from a tile.
+        :param x: Tile x.
+        :param y: Tile y.
+        :return: String of moves ('n', 'e', 's', 'w').
+        """
+
+        if (x, y) in self.exits:
+            return self.exits[(x, y)]
+        return ''.join(move for move in FACINGS if self.tunnels.get_neighbour(x, y, move) is not None)
+
+    def get_cost(self, tiles):
+        """
+        Works out the cost of moving along part of a corridor.
+        :param tiles: List of (x, y, facing) for every tile moved onto.
+        :return: Number of moves, with tunnel tiles costing TUNNEL_COST.
+        """
+
+        return sum(self.tunnels.get_cost(x, y) for x, y, _ in tiles)
+
+    def follow(self, x, y, move, end=None):
+        """
+        Moves from a tile and keeps going along the corridor until a junction (or the end tile) is reached.
+        :param x: Tile x.
+        :param y: Tile y.
+        :param move: First move ('n', 'e', 's', 'w').
+        :param end: Tile to stop at (optional).
+        :return: List of (x, y, facing) for every tile moved onto, or None if the corridor loops forever.
+        """
+
+        tiles = []
+        while len(tiles) <= self.limit:
+            tile = self.tunnels.get_neighbour(x, y, move)
+            if tile not in self.exits:
+                return None
+            x, y = tile
+            tiles.append((x, y, move))
+            if (x, y) in self.junctions or (x, y) == end:
+                return tiles
+
+            # Corridors have two exits, one of which is behind
+            first, second = self.exits[(x, y)]
+            move = second if first == OPPOSITES[move] else first
+
+    def get_legs(self, node, end):
+        """
+        Returns where each corridor leaving a node goes to. A sprite can't turn around, so the corridor behind it is
+        left out.
+        :param node: Current Node.
+        :param end: End tile (tilex, tiley).
+        :return: List of (x, y, facing, cost).
+        """
+
+        legs = []
+        if (node.x, node.y) not in self.junctions:
+            # Only the start of a search can be part way down a corridor
+            for move in self.get_exits(node.x, node.y):
+                if move != OPPOSITES[node.facing]:
+                    tiles = self.follow(node.x, node.y, move, end)
+                    if tiles is not None:
+                        legs.append((*tiles[-1], self.get_cost(tiles)))
+            return legs
+
+        # The end can be part way down one of the corridors
+        stops = {(x, y, move): (cost, facing) for x, y, move, cost, facing in self.corridors.get(end, [])}
+        for move in FACINGS:
+            if move == OPPOSITES[node.facing] or (node.x, node.y, move) not in self.edges:
+                continue
+            if (node.x, node.y, move) in stops:
+                cost, facing = stops[(node.x, node.y, move)]
+                legs.append((*end, facing, cost))
+            else:
+                legs.append(self.edges[(node.x, node.y, move)])
+
+        return legs
+
+    def expand(self, route):
+        """
+        Turns a route through the graph back into every tile passed.
+        :param route: Route in (x, y, facing) format.
+        :return: Path in (x, y) format.
+        """
+
+        x, y, facing = route[0]
+        path = [(x, y)]
+        for end_x, end_y, end_facing in route[1:]:
+            # Taking the shortest corridor that reaches the next stop facing the same way as the route
+            best = None
+            for move in self.get_exits(x, y):
+                if move == OPPOSITES[facing]:
+                    continue
+                tiles = self.follow(x, y, move, (end_x, end_y))
+                if tiles is not None and tiles[-1] == (end_x, end_y, end_facing):
+                    if best is None or self.get_cost(tiles) < self.get_cost(best):
+                        best = tiles
+            path += [(tile_x, tile_y) for tile_x, tile_y, _ in best]
+            x, y, facing = end_x, end_y, end_facing
+
+        return path
+
+
+def group_by_end(queries):
     """
-    Checks if a child is already in the closed set (already been evaluated).
-    :param child: Node object of child to be tested.
-    :param closed: List of nodes in closed set.
-    :return: Boolean as to whether or not the child is in the closed set.
+    Groups search queries by their end tile.
+    :param queries: List of (start, end, facing).
+    :return: Dictionary of end: list of queries, in the order the ends first appear.
+    """
+
+    groups = OrderedDict()
+    for query in queries:
+        groups.setdefault(query[1], []).append(query)
+    return groups
+
+
+def get_direction(tile, next_tile, wraps=None):
+    """
+    Works out which move goes from one tile to a neighbouring tile.
+    :param tile: (tilex, tiley).
+    :param next_tile: (tilex, tiley).
+    :param wraps: Wrap around tunnels of the maze (optional), so tiles either side of a tunnel count as neighbours.
+    :return: Move ('n', 'e', 's', 'w'), or None if the tiles aren't neighbours.
+    """
+
+    vector = (next_tile[0] - tile[0], next_tile[1] - tile[1])
+    for move in FACINGS:
+        if VECTORS[move] == vector:
+            return move
+        if wraps and wraps.get((*tile, move)) == tuple(next_tile):
+            return move
+
+
+def get_children(node, board):
+    """
+    Returns next available tiles from current tile. This can then be added to the list of children.
+    :param node: Current tile.
+    :param board: WalkableBoard of the maze.
+    :return: List of children of current tile.
     """
 
-    for node in closed:
-        if node.x == child.x and node.y == child.y:
-            return True
-    return False
+    # The moves out of every tile (including through the wrap around tunnels) are already in the board's table
+    return [Node(x, y, move, node) for move, x, y in board.get_children(node.x, node.y, node.facing)]
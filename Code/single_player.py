@@ -1,14 +1,17 @@
 __author__ = 'Will Evans'
 
+import assets
 import os
 import pygame as pg
 from datastructures import Maze
 from sprites import *
+from pathfinding import PathScheduler
 from time import sleep
 import local_database
 import threading
 import local_settings
 import gui
+import window
 
 
 class Classic:
@@ -80,6 +83,9 @@ class Classic:
         """
 
         # Essential
+        if self.game_finished:
+            # The initials input box is drawn over the whole window, so the level must be drawn again underneath it
+            self.level.redraw()
         self.level.run(win, events)  # bool -: True if level won, false if pac-man dead and None if neither
 
         # Variables
@@ -152,6 +158,17 @@ class Classic:
     def get_error(self):
         return self.error_message
 
+    def get_dirty_rects(self):
+        """
+        :return: List of the rects that have changed on the window this frame, or None if the whole window should be
+        updated.
+        """
+
+        # The initials input box is see-through, so the whole window is updated (and cleared) while it is shown
+        if self.game_finished:
+            return None
+        return self.level.get_dirty_rects()
+
     def quit(self):
         pg.mixer.music.stop()
         self.level.quit()
@@ -226,31 +243,26 @@ class Level:
         # Indicators
         self.one_up = gui.Word('1UP', (6 * 12, 0.8 * 12), (234, 234, 234), 24, win_scale)
         self.score_position = (7 * 12, 2 * 12)
-        self.score_indicator = gui.Word('{}'.format(self.score), self.score_position, (234, 234, 234), 24, win_scale)
+        self.score_indicator = gui.NumberWord(self.score, self.score_position, (234, 234, 234), 24, win_scale)
 
         self.highscore_text_position = (19 * 12, 0.8 * 12)
         self.highscore_position = (17 * 12, 2 * 12)
 
         self.highscore_text = gui.Word('high score', self.highscore_text_position, (234, 234, 234), 24, win_scale)
 
-        if self.score > self.highscore:
-            self.highscore_indicator = gui.Word('{}'.format(self.score),
-                                                 self.highscore_position,
-                                                 (234, 234, 234),
-                                                 24,
-                                                 win_scale
-                                                 )
-        else:
-            self.highscore_indicator = gui.Word('{}'.format(self.highscore),
-                                                 self.highscore_position,
-                                                 (234, 234, 234),
-                                                 24,
-                                                 win_scale
-                                                 )
+        self.highscore_indicator = gui.NumberWord(max(self.score, self.highscore),
+                                                  self.highscore_position,
+                                                  (234, 234, 234),
+                                                  24,
+                                                  win_scale
+                                                  )
 
         self.life_indicators = []
-        skin = pg.transform.scale(pg.image.load('Resources\\sprites\\pac-man\\w_0.png'),
-                                  (22 * win_scale, 22 * win_scale))
+        # Every sprite's skins are loaded once, and shared by the sprites (and the levels after this one)
+        assets.prewarm(['pac-man', 'blinky', 'pinky', 'clyde', 'inky'])
+
+        skin = assets.get_image(os.path.join('Resources', 'sprites', 'pac-man', 'w_0.png'),
+                                (22 * win_scale, 22 * win_scale))
 
         for num in range(lives - 1):
             rect = skin.get_rect(center=((num * 24 * win_scale + 18 * win_scale), (35 * 12 * win_scale)))
@@ -261,12 +273,8 @@ class Level:
         self.game_over_text = gui.Word('game over', (18 * 12, 20.5 * 12), (255, 0, 0), 21, win_scale)
 
         # Points (displayed when Pac-Man eats a ghost).
-        self.points_text = {}
-        for text in os.listdir('Resources\\sprites\\{}'.format('points')):
-            # noinspection PyUnresolvedReferences
-            self.points_text.update({text: pg.transform.scale(
-                pg.image.load('Resources\\sprites\\{}\\{}'.format('points', text)),
-                ((24 * win_scale), (10 * win_scale)))})
+        self.points_text = assets.get_images(os.path.join('Resources', 'sprites', 'points'),
+                                             ((24 * win_scale), (10 * win_scale)))
 
         # Pac-Man
         self.pac_man = PacMan('pac-man', self.game_maze, win_scale)
@@ -280,17 +288,21 @@ class Level:
         self.ghosts.append(Clyde('clyde', self.pac_man, self.game_maze, win_scale, level_num))
         self.ghosts.append(Inky('inky', self.pac_man, self.game_maze, win_scale, level_num, blinky))
 
+        # Every ghost's searches in a frame are answered together
+        self.path_scheduler = PathScheduler()
+        for ghost in self.ghosts:
+            ghost.set_scheduler(self.path_scheduler)
+
         # Pellets
         self.pellets = pellets
         self.power_pellets = power_pellets
 
         if pellets == [] and power_pellets == []:
             pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'pellet.png')
-            pellet_skin = pg.transform.scale(pg.image.load(pellet_skin_path), (4 * win_scale, 4 * win_scale))
+            pellet_skin = assets.get_image(pellet_skin_path, (4 * win_scale, 4 * win_scale))
 
             power_pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'power_pellet.png')
-            power_pellet_skin = pg.transform.scale(pg.image.load(power_pellet_skin_path),
-                                                   (12 * win_scale, 12 * win_scale))
+            power_pellet_skin = assets.get_image(power_pellet_skin_path, (12 * win_scale, 12 * win_scale))
 
             pellet_sound_channel = pg.mixer.Channel(2)
             pellet_sound_channel.set_volume(0.5 * (local_settings.get_setting('game_volume') / 100))
@@ -324,6 +336,12 @@ class Level:
             for power_pellet in self.power_pellets:
                 power_pellet.predator = self.pac_man
 
+        # The maze and pellets are drawn once onto the renderer's background, and only the parts of the window that
+        # change are drawn each frame. Levels are drawn onto the logical surface (see window.py)
+        assert win_scale == window.LOGICAL_SCALE
+        self.renderer = gui.DirtyRenderer(pg.Surface(window.LOGICAL_SIZE))
+        self.draw_background()
+
         # Sound
         self.large_pellet_channel = pg.mixer.Channel(3)
         self.large_pellet_channel.set_volume(0.5 * (local_settings.get_setting('game_volume') / 100))
@@ -351,25 +369,19 @@ class Level:
         :return: Boolean returns True if level is won, False if level is lost, None otherwise
         """
 
+        self.renderer.clear(win)
+
         # Before the game starts (music)
         if self.start_clock < self.start_cap:
             self.start_clock += 1 / 60
-            self.one_up.display(win)
-            self.score_indicator.display(win)
-            self.highscore_text.display(win)
-            self.highscore_indicator.display(win)
-            self.game_maze.display(win)
+            self.display_indicators(win)
 
-            self.ready_text.display(win)
-            for pellet in self.pellets:
-                pellet.display(win)
+            self.renderer.draw(win, self.ready_text, self.ready_text.get_rect())
             for power_pellet in self.power_pellets:
-                power_pellet.display(win)
-            for life_indicator in self.life_indicators:
-                life_indicator.display(win)
+                self.renderer.draw(win, power_pellet, power_pellet.rect)
             for ghost in self.ghosts:
-                ghost.display(win)
-            self.pac_man.display(win)
+                self.renderer.draw(win, ghost, ghost.skin_rect)
+            self.renderer.draw(win, self.pac_man, self.pac_man.skin_rect)
 
         # If there are no pellets the maze will flash
         elif len(self.pellets) == 0:
@@ -378,19 +390,13 @@ class Level:
                 self.flashing_map_clock = 0
                 self.flashing_map_count += 1
                 self.game_maze.change_skin()
+                self.draw_background()
             if self.flashing_map_count == 7:
                 self.finished = True
                 self.won = True
 
-            self.game_maze.display(win)
-
-            self.one_up.display(win)
-            self.score_indicator.display(win)
-            self.highscore_text.display(win)
-            self.highscore_indicator.display(win)
-            for life_indicator in self.life_indicators:
-                life_indicator.display(win)
-            self.pac_man.display(win)
+            self.display_indicators(win)
+            self.renderer.draw(win, self.pac_man, self.pac_man.skin_rect)
 
         # Mainloop of the level
         else:
@@ -398,30 +404,21 @@ class Level:
             #   Controls flashing of one up
             self.one_up_clock += 1 / 60
             if 0.4 > self.one_up_clock > 0.2:
-                self.one_up.display(win)
+                self.renderer.draw(win, self.one_up, self.one_up.get_rect())
             elif 0.4 < self.one_up_clock:
                 self.one_up_clock = 0
 
-            self.score_indicator = gui.Word('{}'.format(self.score),
-                                             self.score_position,
-                                             (234, 234, 234),
-                                             24,
-                                             self.win_scale
-                                             )
+            self.score_indicator.set_number(self.score)
 
-            self.score_indicator.display(win)
+            self.renderer.draw(win, self.score_indicator, self.score_indicator.get_rect())
             if self.score > self.highscore:
-                self.highscore_indicator = gui.Word('{}'.format(self.score),
-                                                     self.highscore_position,
-                                                     (234, 234, 234),
-                                                     24,
-                                                     self.win_scale)
+                self.highscore_indicator.set_number(self.score)
 
             if not self.extra_life_claimed:
                 if self.score > 10000:
                     self.lives += 1
-                    skin = pg.transform.scale(pg.image.load('Resources\\sprites\\pac-man\\w_0.png'),
-                                              (22 * self.win_scale, 22 * self.win_scale))
+                    skin = assets.get_image(os.path.join('Resources', 'sprites', 'pac-man', 'w_0.png'),
+                                            (22 * self.win_scale, 22 * self.win_scale))
                     for num in range(self.lives - 1):
                         rect = skin.get_rect(center=(
                                                     (num * 24 * self.win_scale + 18 * self.win_scale),
@@ -432,31 +429,27 @@ class Level:
                         self.life_indicators.append(StaticSprite([skin], rect))
                     self.extra_life_claimed = True
 
-            self.highscore_text.display(win)
-            self.highscore_indicator.display(win)
+            self.renderer.draw(win, self.highscore_text, self.highscore_text.get_rect())
+            self.renderer.draw(win, self.highscore_indicator, self.highscore_indicator.get_rect())
 
             #   Life indicators
             for life_indicator in self.life_indicators:
-                life_indicator.display(win)
-
-            # Maze
-            self.game_maze.display(win)
-            self.game_maze.display(win)
+                self.renderer.draw(win, life_indicator, life_indicator.rect)
 
-            # Pellets
+            # Pellets (drawn on the background, so they only need to be rubbed out when eaten)
             for pellet in self.pellets:
                 pellet.update()
-                pellet.display(win)
                 if pellet.eaten:
                     self.score += 10
                     self.level_score += 10
                     self.pellets_eaten += 1
                     self.pellets.remove(pellet)
+                    self.remove_pellet(win, pellet)
 
             #  Power pellets
             for power_pellet in self.power_pellets:
                 power_pellet.update()
-                power_pellet.display(win)
+                self.renderer.draw(win, power_pellet, power_pellet.rect)
                 if power_pellet.eaten:
                     self.score += 50
                     self.level_score += 50
@@ -470,7 +463,7 @@ class Level:
 
             # Pac-Man
             self.pac_man.update(events)
-            self.pac_man.display(win)
+            self.renderer.draw(win, self.pac_man, self.pac_man.skin_rect)
 
             # Checks whether the level has ended
             if self.pac_man.dead:
@@ -484,8 +477,8 @@ class Level:
                 self.finished = True
                 if self.lives == 1:
                     self.lives -= 1
-                    self.game_over_text.display(win)
-                    pg.display.update()
+                    self.renderer.draw(win, self.game_over_text, self.game_over_text.get_rect())
+                    window.present(win)
                     sleep(2)
 
             # Ghosts
@@ -498,17 +491,21 @@ class Level:
                     self.ghosts_eaten += 1
                     self.ghosts_copy.remove(ghost)
                     for ghost_ in self.ghosts_copy:
-                        ghost_.display(win)
+                        self.renderer.draw(win, ghost_, ghost_.skin_rect)
                     points = 200 * 2 ** ((len(self.ghosts) - 1) - len(self.ghosts_copy))
                     self.score += points
                     self.level_score += points
 
-                    win.blit(self.points_text['{}.png'.format(str(points))],
-                             (self.pac_man.x, self.pac_man.y - 8 * self.win_scale))
-                    pg.display.update()
+                    points_text = self.points_text['{}.png'.format(str(points))]
+                    self.renderer.add(win.blit(points_text, (self.pac_man.x, self.pac_man.y - 8 * self.win_scale)))
+                    window.present(win)
                     sleep(1)
 
             if not self.pac_man.dead:
+                self.path_scheduler.new_frame()
+                for ghost in self.ghosts:
+                    ghost.submit_path()
+
                 for ghost in self.ghosts:
                     if ghost.__class__.__name__ == 'Blinky':
                         if len(self.pellets) < 20 + 2 * self.level_num:
@@ -517,7 +514,65 @@ class Level:
                             ghost.elroy_upgrade()
 
                     ghost.update(events)
-                    ghost.display(win)
+                    self.renderer.draw(win, ghost, ghost.skin_rect)
+
+    def display_indicators(self, win):
+        """
+        Displays the score, highscore and life indicators.
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :type win: Surface.
+        :return: None
+        """
+
+        for indicator in (self.one_up, self.score_indicator, self.highscore_text, self.highscore_indicator):
+            self.renderer.draw(win, indicator, indicator.get_rect())
+        for life_indicator in self.life_indicators:
+            self.renderer.draw(win, life_indicator, life_indicator.rect)
+
+    def draw_background(self):
+        """
+        Draws the maze and pellets onto the renderer's background. The whole window is redrawn next frame.
+        :return: None
+        """
+
+        background = self.renderer.background
+        background.fill((0, 0, 0))
+        self.game_maze.display(background)
+        for pellet in self.pellets:
+            pellet.display(background)
+        self.renderer.redraw()
+
+    def remove_pellet(self, win, pellet):
+        """
+        Rubs an eaten pellet out of the background (and the window).
+        :param win: The current window, all objects must be blitted to this window to be displayed.
+        :type win: Surface.
+        :param pellet: The eaten pellet.
+        :type pellet: Pellet.
+        :return: None
+        """
+
+        background = self.renderer.background
+        background.set_clip(pellet.rect)
+        background.fill((0, 0, 0))
+        self.game_maze.display(background)
+        background.set_clip(None)
+        self.renderer.restore(win, pellet.rect)
+
+    def redraw(self):
+        """
+        Makes the whole window be drawn next frame (for when something else has drawn over it).
+        :return: None
+        """
+
+        self.renderer.redraw()
+
+    def get_dirty_rects(self):
+        """
+        :return: List of the rects that have changed on the window this frame.
+        """
+
+        return self.renderer.get_dirty_rects()
 
     def quit(self):
         """
@@ -1,10 +1,12 @@
 __author__ = 'Will Evans'
 
+import assets
 import pygame as pg
 import gui
 import local_settings
 import local_database
 import os
+import window
 
 
 class StartScreen:
@@ -40,7 +42,7 @@ class StartScreen:
         pac_man_logo_path = os.path.join('resources', 'pac_man_logo.png')
         self.pac_title_scale = 80 * win_scale
         self.pac_title_size = (int(self.pac_title_scale * 3.8), self.pac_title_scale)
-        self.pac_title = pg.transform.smoothscale(pg.image.load(pac_man_logo_path), self.pac_title_size)
+        self.pac_title = assets.get_image(pac_man_logo_path, self.pac_title_size, smooth=True)
         self.pac_title_rect = self.pac_title.get_rect(center=(168 * win_scale, 80 * win_scale))
 
         # Music
@@ -122,7 +124,7 @@ class StartScreen:
 
         else:
             for text in self.__choices:
-                if text.check_mouse(*pg.mouse.get_pos()):
+                if text.check_mouse(*window.get_mouse_pos()):
                     text.react()
 
             self.update_objects(events)
@@ -1,7 +1,11 @@
 __author__ = 'Will Evans'
 
+import assets
 import os
-from pathfinding import Manhattan as Search
+from pathfinding import get_search_class
+from pathfinding import IncrementalSearch
+from pathfinding import ScheduledSearch
+from pathfinding import get_direction
 import pygame as pg
 import random
 import local_settings
@@ -36,23 +40,19 @@ class Sprite:
         self._speed = 1.5
         self.speed_count = 0
 
-        self.skin = '0'
+        self.skin = 0
         self.facing = 'e'
         self.move = 'e'
         self.online_move = 'e'
         self.buffer_move = 'e'
 
         # Skins
-        self.skin = '0'
+        self.skin = 0
         self.skin_cap = 4
 
-        #   Normal Skins
-        self.normal_skins = {}
-        for skin in os.listdir('resources\\sprites\\{}'.format(resource_pack)):
-            # noinspection PyUnresolvedReferences
-            self.normal_skins.update({skin: pg.transform.scale(
-                pg.image.load('resources\\sprites\\{}\\{}'.format(resource_pack, skin)),
-                ((22 * win_scale), (22 * win_scale)))})
+        #   Normal Skins (an atlas of every skin, found by (facing, skin number))
+        self.normal_skins = assets.get_atlas(os.path.join('resources', 'sprites', resource_pack),
+                                             ((22 * win_scale), (22 * win_scale)))
 
         self.skins = self.normal_skins
 
@@ -64,7 +64,7 @@ class Sprite:
         self.previous_tile = self.tile
 
         # Rects
-        self.skin_rect = self.skins['e_0.png'].get_rect(center=(self.x, self.y))
+        self.skin_rect = self.skins.get_rect(center=(self.x, self.y))
         self.rect = pg.Rect(self.x - int(8 * win_scale),
                             self.y - int(8 * win_scale),
                             17 * win_scale,
@@ -154,11 +154,11 @@ class Sprite:
         if move is None:  # Stops the sprite changing skin number when it is not moving.
             move = self.facing
         if self.skin_clock == self.skin_cap:  # Allows the amount of frames between every skin change to be changed.
-            num = abs(int(self.skin) - 1)  # If self.skin is 1 num will become 0. If it is 0 it will become 1.
+            num = 1 - self.skin  # If self.skin is 1 num will become 0. If it is 0 it will become 1.
             self.skin_clock = 0
         else:
             num = self.skin
-        return move, str(num)
+        return move, num
 
     def get_move(self, events):
         """
@@ -240,12 +240,8 @@ class Sprite:
 
         pac_x, pac_y = self.tile.pos
 
-        tiles = []
-        try:
-            # Gets a list of all the tiles surrounding the sprite
-            tiles = [self.maze.tiles[y + pac_y - 3][x + pac_x] for x, y in [(1, 0), (-1, 0), (0, 1), (0, -1)]]
-        except IndexError as e:
-            print(e)
+        # Gets a list of all the tiles surrounding the sprite
+        tiles = [self.get_tile(x + pac_x, y + pac_y - 3) for x, y in [(1, 0), (-1, 0), (0, 1), (0, -1)]]
 
         for tile in tiles:
             if self.rect.colliderect(tile.rect) and tile.type == 'wall':
@@ -309,7 +305,7 @@ class Sprite:
 
         # the position is then used to form the new rectangles which are used for blitting to the screen (skin_rect) and
         # for managing collisions (rect)
-        self.skin_rect = self.skins['{}_{}.png'.format(self.facing, self.skin)].get_rect(center=(self.x, self.y))
+        self.skin_rect = self.skins.get_rect(center=(self.x, self.y))
         self.rect = pg.Rect(self.x - int(6 * self.win_scale),
                             self.y - int(6 * self.win_scale),
                             12 * self.win_scale,
@@ -328,17 +324,16 @@ class Sprite:
         # Gets tile x,y coords for the sprites current tile
         tile_x, tile_y = self.tile.pos
 
-        # If we do the following when the sprite is off the screen (in the tunnel) we get many errors
-        if rect_tile_x > 0:
+        # When the sprite is off the edge of the screen (going through a tunnel) there isn't a tile under it, so it
+        # keeps its last tile until it comes out of the other side
+        row = int(rect_tile_y) - 3
+        if rect_tile_x > 0 and 0 <= row < len(self.maze.tiles) and int(rect_tile_x) < len(self.maze.tiles[row]):
 
             # If the tile x,y from the pixel position is not equal to the current tile, we update the current tile to
             # whichever tile the current pixel coords are inside of
             if not(int(rect_tile_x) == tile_x and int(rect_tile_y) == tile_y):
                 self.previous_tile = self.tile
-                try:
-                    self.tile = self.maze.tiles[int(rect_tile_y) - 3][int(rect_tile_x)]
-                except IndexError as e:
-                    print(e)
+                self.tile = self.maze.tiles[row][int(rect_tile_x)]
                 # If the tile has changed we can receive a new move
                 self.get_new_move = True
 
@@ -350,7 +345,7 @@ class Sprite:
         :return: None
         """
 
-        win.blit(self.skins['{}_{}.png'.format(self.facing, self.skin)], self.skin_rect)
+        self.skins.blit(win, (self.facing, self.skin), self.skin_rect)
 
     def get_next_tile(self, move):
         """
@@ -378,12 +373,20 @@ class Sprite:
         # space for indicators such as score and highscore
         tile_y -= 3
 
-        try:
-            # Because tiles is a two dimensional list the y value must go first
-            return self.maze.tiles[tile_y + y][tile_x + x]
-        except IndexError as e:
-            print(e)
-            return self.maze.tiles[14][0]
+        return self.get_tile(tile_x + x, tile_y + y)
+
+    def get_tile(self, tile_x, tile_y):
+        """
+        Returns a tile of the maze. Tiles past the edges wrap around to the other side, like the tunnels do (e.g. the
+        tile to the right of the last tile in a row is the first tile in the row).
+        :param tile_x: Tile x.
+        :param tile_y: Tile y, without the 3 rows above the maze.
+        :return: Tile object.
+        """
+
+        # Because tiles is a two dimensional list the y value must go first
+        row = self.maze.tiles[tile_y % len(self.maze.tiles)]
+        return row[tile_x % len(row)]
 
     def draw_rect(self, win):
         """
@@ -408,25 +411,17 @@ class PacMan(Sprite):
         super().__init__(resource_pack, position, maze, win_scale)
 
         # Skins
-        self.skin = '0'
+        self.skin = 0
         self.facing = 'e'
         self.move = 'e'
         self.num = 0
 
         #   Death animation
         self.death_animation_index = 0
-        self.death_animation_skins = {}
+        self.death_animation_skins = assets.get_atlas(os.path.join('resources', 'sprites', 'death_animation'),
+                                                      ((22 * win_scale), (22 * win_scale)))
         self.death_animation_finished = False
 
-        for skin in os.listdir(os.path.join('resources', 'sprites', 'death_animation')):
-            self.death_animation_skins.update(
-                {skin: pg.transform.scale(
-                                           pg.image.load(os.path.join('resources', 'sprites', 'death_animation', skin)),
-                                         ((22 * win_scale), (22 * win_scale))
-                                        )
-                 }
-                                                )
-
         # Sounds
         self.sounds = {}
         for sound in os.listdir(os.path.join('resources', 'sounds', resource_pack)):
@@ -474,9 +469,9 @@ class PacMan(Sprite):
         """
 
         if self.dead:
-            win.blit(self.death_animation_skins[f'{self.death_animation_index}.png'], self.skin_rect)
+            self.death_animation_skins.blit(win, (self.death_animation_index,), self.skin_rect)
         elif not self.dead:
-            win.blit(self.skins[f'{self.facing}_{self.skin}.png'], self.skin_rect)
+            self.skins.blit(win, (self.facing, self.skin), self.skin_rect)
 
 
 class Ghost(Sprite):
@@ -520,36 +515,20 @@ class Ghost(Sprite):
 
         # Skins
         self.facing = 'e'
-        self.skin = '0'
+        self.skin = 0
 
         self.skin_cap = 10
 
         skin_size = (22 * win_scale, 22 * win_scale)
-        self.scared_skins = {}
-        for skin in os.listdir(os.path.join('resources', 'sprites', 'scared')):
-            scared_skin_path = os.path.join('resources', 'sprites', 'scared', skin)
-            self.scared_skins.update(
-                {skin: pg.transform.scale(pg.image.load(scared_skin_path), skin_size)}
-            )
-
-        self.dead_skins = {}
-        for skin in os.listdir(os.path.join('resources', 'sprites', 'dead')):
-            dead_skin_path = os.path.join('resources', 'sprites', 'dead', skin)
-            self.dead_skins.update(
-                {skin: pg.transform.scale(pg.image.load(dead_skin_path), skin_size)}
-            )
-
-        self.scared_flashing_skins = {}
-        for skin in os.listdir(os.path.join('resources', 'sprites', 'scared_flashing')):
-            scared_flashing_skin_path = os.path.join('resources', 'sprites', 'scared_flashing', skin)
-            self.scared_flashing_skins.update(
-                {skin: pg.transform.scale(pg.image.load(scared_flashing_skin_path), skin_size)}
-            )
+        self.scared_skins = assets.get_atlas(os.path.join('resources', 'sprites', 'scared'), skin_size)
+        self.dead_skins = assets.get_atlas(os.path.join('resources', 'sprites', 'dead'), skin_size)
+        self.scared_flashing_skins = assets.get_atlas(os.path.join('resources', 'sprites', 'scared_flashing'),
+                                                      skin_size)
 
         self.colour = (255, 255, 255)
 
         # Rect
-        self.skin_rect = self.skins['e_0.png'].get_rect(center=(self.x, self.y))
+        self.skin_rect = self.skins.get_rect(center=(self.x, self.y))
 
         self.mode_index = 0
         self.mode_count = 0
@@ -569,7 +548,18 @@ class Ghost(Sprite):
         self.respawned = False
 
         # Path finding
-        self.search = Search(maze.tile_map)
+        self.search = get_search_class()(maze.tile_map, maze.next_hops, board=maze.board)
+
+        # Pac-Man only moves one tile at a time, so without a NextHopTable the chase path is repaired rather than
+        # searched for every time
+        self.chase_search = IncrementalSearch(self.search)
+
+        # Tiles that can be targeted (Pinky and Inky target tiles near Pac-Man, which may be walls)
+        self.reachability = maze.reachability
+
+        # Between junctions (tiles that don't have exactly two exits) a ghost can only keep going forward, so paths are
+        # only searched for at junctions
+        self.junctions = maze.junctions
 
         self.target = target
 
@@ -578,6 +568,7 @@ class Ghost(Sprite):
         self.next_coords = self.scatter()[1]
 
         self.path = self.get_path(self.mode)
+        self.path_mode = self.mode
 
         self.next_x = 0
         self.next_y = 0
@@ -704,33 +695,15 @@ class Ghost(Sprite):
         :return: Ghost's move.
         """
 
-        # When a ghost is in a tunnel their speed must decrease to 0.8, they must continue in the direction they are
-        # facing and as soon as they leave the tunnel they must get a new path
-
-        path = self.path
-
-        if self.tile.pos[1] == 17:
-            if self.tile.pos[0] <= 5 or self.tile.pos[0] >= 22:
-                self._speed = 0.8
-                if self.tile.pos[0] == 5 or self.tile.pos[0] == 22:
-                    path = self.get_path(self.mode)
-                    if path is None:
-                        return self.facing
-                else:
-                    return self.facing
-            else:
-                if not self.scared:
-                    if not self.dead:
-                        self._speed = self.speed_buffer
-
-        self.path = path
-        self.next_coords = self.path[1]
+        # When a ghost is in a tunnel their speed must decrease to 0.8
+        tile_x, tile_y = self.tile.pos
+        if (tile_x, tile_y - 3) in self.maze.tunnels:
+            self._speed = 0.8
 
         # This bit tests to see if the ghost has reached the 'next coords'. If it has, then new coords are calculated
-        tile_x, tile_y = self.tile.pos
         x, y = self.next_coords
 
-        if x == tile_x and y == tile_y - 3:
+        if x == tile_x and y == tile_y - 3 and not self.follow_path((x, y)):
             path = self.get_path(self.mode)
 
             if path is None:
@@ -740,8 +713,14 @@ class Ghost(Sprite):
                 return self.facing
 
             self.path = path
+            self.path_mode = self.mode
             self.next_coords = self.path[1]
 
+        # Paths go through the tunnels, so the next coords can be on the other side of the maze. The ghost keeps going
+        # the way it is facing (off the edge of the screen) until it comes out of the other end
+        if self.maze.wraps.get((tile_x, tile_y - 3, self.facing)) == tuple(self.next_coords):
+            return self.facing
+
         # Works out which direction the next coordinates are
         x, y = self.next_coords
         y += 3
@@ -781,30 +760,18 @@ class Ghost(Sprite):
         :return: Ghost's move.
         """
 
-        # When a ghost is in a tunnel their speed must decrease to 0.8, they must continue in the direction they are
-        # facing and as soon as they leave the tunnel they must get a new path
-        if self.tile.pos[1] == 17:
-            if self.tile.pos[0] <= 5 or self.tile.pos[0] >= 22:
-                self._speed = 0.8
-                if self.tile.pos[0] == 5 or self.tile.pos[0] == 22:
-                    try:
-                        self.path = self.get_path(self.mode)
-                        self.next_coords = self.path[1]
-                    except Exception as e:
-                        print(e)
-                return self.facing
-            else:
-                if not self.scared:
-                    if not self.dead:
-                        self._speed = self.speed_buffer
+        # When a ghost is in a tunnel their speed must decrease to 0.8
+        tile_x, tile_y = self.tile.pos
+        if (tile_x, tile_y - 3) in self.maze.tunnels:
+            self._speed = 0.8
 
         # This bit tests to see if the ghost has reached the 'next coords'. If it has, then new coords are calculated
-        tile_x, tile_y = self.tile.pos
         x, y = self.next_coords
 
-        if x == tile_x and y == tile_y - 3:
+        if x == tile_x and y == tile_y - 3 and not self.follow_path((x, y)):
             try:
                 self.path = self.get_path(self.mode)
+                self.path_mode = self.mode
                 self.next_coords = self.path[1]
             except TypeError as e:
                 print(e)
@@ -814,6 +781,11 @@ class Ghost(Sprite):
                 except TypeError as e:
                     print(e)
 
+        # Paths go through the tunnels, so the next coords can be on the other side of the maze. The ghost keeps going
+        # the way it is facing (off the edge of the screen) until it comes out of the other end
+        if self.maze.wraps.get((tile_x, tile_y - 3, self.facing)) == tuple(self.next_coords):
+            return self.facing
+
         # Works out which direction the next coordinates are
         x, y = self.next_coords
         y += 3
@@ -867,6 +839,32 @@ class Ghost(Sprite):
 
         return super().validate_move(move)
 
+    def is_following(self, tile):
+        """
+        Checks whether the ghost can carry on along its current path from a tile without a search. This is the case
+        when the tile isn't a junction, the mode hasn't changed since the path was found and the path hasn't run out.
+        :param tile: Tile the ghost has reached (tilex, tiley) in maze coords.
+        :return: True if the path can be followed.
+        """
+
+        return (tile not in self.junctions and self.mode == self.path_mode and self.path is not None and
+                len(self.path) > 2 and tuple(self.path[1]) == tile)
+
+    def follow_path(self, tile):
+        """
+        Moves the next coords on along the current path when the ghost is part way down a corridor, as the only way
+        it can go is forward.
+        :param tile: Tile the ghost has reached (tilex, tiley) in maze coords.
+        :return: True if the next coords were moved on (so no search is needed).
+        """
+
+        if not self.is_following(tile):
+            return False
+
+        self.path = self.path[1:]
+        self.next_coords = self.path[1]
+        return True
+
     def get_path(self, mode):
         """
         Uses the mode to get a path. This middle man is needed in case the target is unreachable (in which case the path
@@ -880,6 +878,51 @@ class Ghost(Sprite):
             path = self.chase()
         return path
 
+    def set_scheduler(self, scheduler):
+        """
+        Sends the ghost's searches through a per-frame PathScheduler, so they are answered together with the other
+        ghosts' searches.
+        :param scheduler: PathScheduler object (shared by every ghost in the level).
+        :return: None
+        """
+
+        self.search = scheduler.bind(self.search)
+        self.chase_search.search = self.search
+
+    def submit_path(self):
+        """
+        Submits the search the ghost is expected to make when it reaches its next coords to its PathScheduler. If it
+        has reached them, get_path is answered this frame in the same batch as the other ghosts. Otherwise the search
+        is started ahead of time (if the scheduler has a PathPool). Only modes with a fixed target are submitted, the
+        others are still answered when get_path asks for them.
+        :return: None
+        """
+
+        if not isinstance(self.search, ScheduledSearch):
+            return
+
+        tile_x, tile_y = self.tile.pos
+        tile = (tile_x, tile_y - 3)
+        next_tile = tuple(self.next_coords)
+        if self.is_following(next_tile):
+            return
+
+        if self.mode == self.respawn:
+            target_tile = (13, 14) if self.respawned else (13, 18)
+        elif self.mode == self.scatter and not self.elroy:
+            target_tile = self.home
+        else:
+            return
+        target_tile = (target_tile[0], target_tile[1] - 3)
+
+        if next_tile == tile:
+            self.search.submit(tile, target_tile, self.facing)
+        else:
+            # The ghost will be facing the way it moved onto the next coords
+            facing = get_direction(tile, next_tile, self.maze.wraps)
+            if facing is not None:
+                self.search.submit_ahead(next_tile, target_tile, facing)
+
     def scare(self):
         """
         Sets the ghost into scared mode when called.
@@ -982,6 +1025,10 @@ class Ghost(Sprite):
         current_tile = path[1]
         current_x, current_y = current_tile.rect.center
 
+        # A step through a tunnel wraps around the maze, so there is nothing to draw between the two tiles
+        if abs(previous_x - current_x) + abs(previous_y - current_y) > 12 * self.win_scale:
+            return self.get_pathtiles(path[1:], pathtiles)
+
         rect_long = 14 * self.win_scale
         rect_short = 2 * self.win_scale
 
@@ -1051,7 +1098,7 @@ class Ghost(Sprite):
         target_tile = self.target.tile.pos
         start_tile = (start_tile[0], start_tile[1] - 3)
         target_tile = (target_tile[0], target_tile[1] - 3)
-        return self.search.astar(start_tile, target_tile, self.facing)
+        return self.chase_search.astar(start_tile, target_tile, self.facing)
 
     def random(self):
         """
@@ -1145,8 +1192,8 @@ class Pinky(Ghost):
 
     def chase(self):
         """
-        Pathfinding mode: Uses the tile 4 spaces ahead of Pac-Man to get the path. This decreases by one until the
-        target reaches Pac-Man if the tiles in front are not reachable.
+        Pathfinding mode: Uses the tile 4 spaces ahead of Pac-Man to get the path. If that tile can't be reached the
+        nearest tile that can is used instead.
         :return: The next path.
         """
 
@@ -1157,36 +1204,12 @@ class Pinky(Ghost):
 
         targets = {'n': (0, -4), 'e': (4, 0), 's': (0, 4), 'w': (-4, 0)}
         tile_x, tile_y = target_tile
-        facing = self.target.facing
-        x, y = targets[facing]
-
-        if x == 0:
-            change = 'y'
-            tile_x_temp = tile_x
-        else:
-            change = 'x'
-            tile_y_temp = tile_y
-
-        for i in range(5):
-            if change == 'x':
-                if x > 0:
-                    tile_x_temp = tile_x + (x - i)
-                else:
-                    tile_x_temp = tile_x + (x + i)
-            else:
-                if y > 0:
-                    tile_y_temp = tile_y + (y - i)
-                else:
-                    tile_y_temp = tile_y + (y + i)
-
-            try:
-                if self.maze.tiles[abs(tile_y_temp)][tile_x_temp].type in ['pellet', 'empty_tile']:
-                    break
-
-            except IndexError:
-                continue
+        x, y = targets[self.target.facing]
 
-        path = self.search.astar(start_tile, (tile_x_temp, abs(tile_y_temp)), self.facing)
+        target_tile = self.reachability.get_nearest((tile_x + x, tile_y + y))
+        path = None
+        if target_tile is not None:
+            path = self.search.astar(start_tile, target_tile, self.facing)
         if path is None:
             path = super().chase()
         return path
@@ -1263,12 +1286,14 @@ class Clyde(Ghost):
         start_tile = (start_tile[0], start_tile[1] - 3)
         if self.euclidean_distance(self.target) > 8:
             target_tile = self.target.tile.pos
+            search = self.chase_search
         else:
             target_tile = self.home
+            search = self.search
 
         target_tile = (target_tile[0], target_tile[1] - 3)
 
-        path = self.search.astar(start_tile, target_tile, self.facing)
+        path = search.astar(start_tile, target_tile, self.facing)
         if path is None:
             path = super().chase()
         return path
@@ -1326,54 +1351,21 @@ class Inky(Ghost):
     def chase(self):
         """
         Pathfinding mode: Takes the vector between Blinky and Pac-Man and doubles it. Adds this vector to Blinky's
-        position and target that tile.
+        position and target that tile (or the nearest tile to it that can be reached).
         :return: THe next path.
         """
 
-        path = None
         start_tile = self.tile.pos
         start_tile = (start_tile[0], start_tile[1] - 3)
 
         pac_x, pac_y = self.target.tile.pos
         blinky_x, blinky_y = self.blinky.tile.pos
-        vector = (pac_x - blinky_x, pac_y - blinky_y)
-
-        x, y = vector
-
-        target_x, target_y = (pac_x + x, pac_y + y - 3)
-
-        found = False
-
-        try:
-            if self.maze.tiles[abs(target_y)][target_x].type == 'pellet':
-                path = self.search.astar(start_tile, (target_x, abs(target_y)), self.facing)
-                found = True
-
-        except IndexError:
-            if target_x > 26:
-                target_x = 26  # check these numbers to make sure they are the correct ones
-            elif target_x < 1:
-                target_x = 1
-
-            if target_y > 29:
-                target_y = 29
-            elif target_y < 1:
-                target_y = y
-
-        if not found:
-            for x, y in [(0, 0), (-1, 0), (1, 0), (0, 1), (0, -1)]:
-                tile_x_temp = target_x + x
-                tile_y_temp = target_y + y
-                try:
-                    if self.maze.tiles[abs(tile_y_temp)][tile_x_temp].type == 'pellet':
-                        break
-                    else:
-                        continue
-                except IndexError:
-                    continue
-
-            path = self.search.astar(start_tile, (tile_x_temp, abs(tile_y_temp)), self.facing)
+        x, y = (pac_x - blinky_x, pac_y - blinky_y)
 
+        target_tile = self.reachability.get_nearest((pac_x + x, pac_y + y - 3))
+        path = None
+        if target_tile is not None:
+            path = self.search.astar(start_tile, target_tile, self.facing)
         if path is None:
             path = super().chase()
         return path
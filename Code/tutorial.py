@@ -1,5 +1,6 @@
 __author__ = 'Will Evans'
 
+import assets
 import pygame as pg
 import threading
 import os
@@ -10,6 +11,7 @@ import local_database
 import local_settings
 from time import sleep
 import json
+import window
 
 
 class Story:
@@ -209,26 +211,18 @@ class Level:
 
         # Indicators
         self.score_position = (7 * 12, 2 * 12)
-        self.score_indicator = gui.Word('{}'.format(self.score), self.score_position, (234, 234, 234), 24, win_scale)
+        self.score_indicator = gui.NumberWord(self.score, self.score_position, (234, 234, 234), 24, win_scale)
 
         # Start and ready text
         self.ready_text = gui.Word('ready!', (17.5 * 12, 20.5 * 12), (255, 255, 30), 23, win_scale, italic=True)
         self.game_over_text = gui.Word('game over', (18 * 12, 20.5 * 12), (255, 0, 0), 21, win_scale)
 
         # Points (displayed when Pac-Man eats a ghost).
-        self.points_texts = {}
-        for point_text in os.listdir(os.path.join('Resources', 'sprites', 'points')):
-            # noinspection PyUnresolvedReferences
-            self.points_texts.update({point_text: pg.transform.scale(
-                pg.image.load(
-                    os.path.join('Resources', 'sprites', 'points', point_text)),
-                    (
-                        (24 * win_scale), (10 * win_scale)
-                    )
-                            )
-            })
+        self.points_texts = assets.get_images(os.path.join('Resources', 'sprites', 'points'),
+                                              ((24 * win_scale), (10 * win_scale)))
 
         # Pac-Man
+        assets.prewarm(['pac-man', 'blinky', 'pinky', 'clyde', 'inky'])
         self.pac_man = sprites.PacMan('pac-man', self.game_maze, win_scale)
 
         # Ghosts
@@ -265,11 +259,9 @@ class Level:
 
         if pellets == [] and power_pellets == []:
             pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'pellet.png')
-            pellet_skin = pg.transform.scale(pg.image.load(pellet_skin_path), (4 * win_scale, 4 * win_scale))
+            pellet_skin = assets.get_image(pellet_skin_path, (4 * win_scale, 4 * win_scale))
             power_pellet_skin_path = os.path.join('Resources', 'sprites', 'pellets', 'power_pellet.png')
-            power_pellet_skin = pg.transform.scale(pg.image.load(power_pellet_skin_path),
-                                                   (12 * win_scale, 12 * win_scale)
-                                                   )
+            power_pellet_skin = assets.get_image(power_pellet_skin_path, (12 * win_scale, 12 * win_scale))
 
             pellet_sound_channel = pg.mixer.Channel(2)
             pellet_sound_channel.set_volume(0.5 * (local_settings.get_setting('game_volume')/100))
@@ -397,12 +389,7 @@ class Level:
         else:
 
             # Score Indicators
-            self.score_indicator = gui.Word('{}'.format(self.score),
-                                             self.score_position,
-                                             (234, 234, 234),
-                                             24,
-                                             self.win_scale
-                                             )
+            self.score_indicator.set_number(self.score)
 
             self.score_indicator.display(win)
 
@@ -468,7 +455,7 @@ class Level:
 
                     win.blit(self.points_texts['{}.png'.format(str(points))],
                              (self.pac_man.x, self.pac_man.y - 8 * self.win_scale))
-                    pg.display.update()
+                    window.present(win)
                     sleep(1)
 
             if not self.pac_man.dead:
@@ -0,0 +1,97 @@
+__author__ = 'Will Evans'
+
+import pygame as pg
+
+# Everything is drawn onto a surface of this size (28 x 36 tiles of 12 pixels), which is upscaled to the window once per
+# frame. Programs are given LOGICAL_SCALE as their window scale, whatever size the window is
+LOGICAL_SIZE = (28 * 12, 36 * 12)
+LOGICAL_SCALE = 1
+
+# How many times larger than the logical surface the window is
+scale = 1
+
+# The whole window must be upscaled next frame (e.g. it has just been made)
+full_update = True
+
+
+def create_window(win_scale):
+    """
+    Makes the window (or resizes it), the logical surface is upscaled to fit it.
+    :param win_scale: Window Scale (How large the window is - from the settings).
+    :return: The window's Surface.
+    """
+
+    global scale, full_update
+
+    scale = win_scale
+    full_update = True
+
+    x = int(LOGICAL_SIZE[0] * win_scale)
+    y = int(LOGICAL_SIZE[1] * win_scale)
+    return pg.display.set_mode((x, y))
+
+
+def scale_rect(rect):
+    """
+    :param rect: Rect on the logical surface.
+    :return: Rect covering the same part of the window.
+    """
+
+    x, y, w, h = rect
+    return pg.Rect(int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+
+
+def present(win, rects=None):
+    """
+    Upscales the logical surface to the window and updates the display. When the window is a whole number of times
+    larger, only the rects that have changed need to be upscaled, as each pixel just becomes a square of pixels.
+    :param win: The logical surface that everything has been drawn on.
+    :param rects: List of rects of the logical surface that have changed (None for all of it).
+    :return: None
+    """
+
+    global full_update
+
+    screen = pg.display.get_surface()
+
+    if rects is None or full_update or scale != int(scale):
+        if screen.get_size() == win.get_size():
+            screen.blit(win, (0, 0))
+        else:
+            pg.transform.scale(win, screen.get_size(), screen)
+        pg.display.update()
+        full_update = False
+        return
+
+    screen_rects = []
+    for rect in rects:
+        rect = win.get_rect().clip(rect)
+        if rect.width and rect.height:
+            screen_rect = scale_rect(rect)
+            screen.blit(pg.transform.scale(win.subsurface(rect), screen_rect.size), screen_rect)
+            screen_rects.append(screen_rect)
+    pg.display.update(screen_rects)
+
+
+def get_mouse_pos():
+    """
+    :return: (x, y) position of the mouse on the logical surface.
+    """
+
+    x, y = pg.mouse.get_pos()
+    return int(x / scale), int(y / scale)
+
+
+def get_events():
+    """
+    Gets the events from pygame, with the positions of mouse events moved onto the logical surface.
+    :return: List of events.
+    """
+
+    events = []
+    for event in pg.event.get():
+        if event.type in (pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP, pg.MOUSEMOTION):
+            x, y = event.pos
+            event = pg.event.Event(event.type, dict(event.dict, pos=(int(x / scale), int(y / scale))))
+        events.append(event)
+    return events